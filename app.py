@@ -1,15 +1,17 @@
 import streamlit as st
 import os
-from modules.peer_comparison import compare_files
+from modules.peer_comparison import (DEFAULT_TOP_K, MAX_SHOWN_PASSAGES, SPARSE_MIN_FILES, compare_passages,
+                                     compare_with_history)
+from modules.peer_corpus import PeerCorpus
 from modules.plagiarism_check import check_plagiarism
 from modules.ai_content import detect_ai_content
+from modules.text_extraction import PROMPT_CHAR_LIMIT, extract_texts
 from modules.ocr import perform_ocr, save_ocr_result
-from modules.ans_eval import evaluate_answers
-from modules.omr_processor import OMRProcessor
+from modules.ans_eval import evaluate_batch, evaluate_by_question, get_feature_cache, get_key_library, load_key_profile
+from modules.profiling import PROFILE_PATH, get_profiler
 from fpdf import FPDF
 import io
 from datetime import datetime
-import cv2
 import numpy as np
 import pandas as pd
 from streamlit_lottie import st_lottie
@@ -21,14 +23,21 @@ if 'ocr_results' not in st.session_state:
     st.session_state.ocr_results = {}
 if 'last_files_count' not in st.session_state:
     st.session_state.last_files_count = 0
+if 'question_results' not in st.session_state:
+    st.session_state.question_results = {}
 if 'checkboxes' not in st.session_state:
     st.session_state.checkboxes = {
         'peer_comparison': False,
         'plagiarism_check': False,
         'ai_detection': False
     }
-if 'omr_processor' not in st.session_state:
-    st.session_state.omr_processor = OMRProcessor()
+
+def get_omr_processor():
+    """Create the OMR processor on first use so OpenCV only loads for OMR work"""
+    if 'omr_processor' not in st.session_state:
+        from modules.omr_processor import OMRProcessor
+        st.session_state.omr_processor = OMRProcessor()
+    return st.session_state.omr_processor
 
 def reset_checkboxes():
     """Reset all checkboxes to unchecked state"""
@@ -104,10 +113,29 @@ def generate_pdf_report(results_data):
         pdf.output(buffer)
         return buffer.getvalue()
 
-def generate_peer_comparison(temp_files):
+def get_peer_corpus(top_k):
+    """Peer comparison corpus of this session, loaded from disk on first use"""
+    corpus = st.session_state.get('peer_corpus')
+    if corpus is None or corpus.top_k != top_k:
+        corpus = PeerCorpus.load(top_k=top_k)
+        st.session_state.peer_corpus = corpus
+    return corpus
+
+def generate_peer_comparison(temp_files, texts, boilerplate=(), batch=None):
     """Generate peer comparison section for the report"""
     peer_results = []
-    results = compare_files(temp_files)
+    # Large classes only keep each file's closest peers instead of every pair
+    top_k = DEFAULT_TOP_K if len(temp_files) > SPARSE_MIN_FILES else None
+    corpus = get_peer_corpus(top_k)
+    # Only new or changed files are extracted and compared; the rest is reused
+    if corpus.add_files(temp_files, texts.__getitem__):
+        if top_k is None:
+            # Small classes get every pair scored with the IDF of the whole class
+            corpus.rescore()
+        corpus.save()
+    results = corpus.similarities()
+    show_table = len(results) > SPARSE_MIN_FILES
+    table_rows = []
     
     for files, similarity in results.items():
         if len(files) == 2:
@@ -117,6 +145,13 @@ def generate_peer_comparison(temp_files):
                 f"Comparing {os.path.basename(file1)} with {os.path.basename(file2)}\n"
                 f"Similarity Score: {similarity_percentage:.1f}%\n"
             )
+            if show_table:
+                table_rows.append({
+                    "File 1": os.path.basename(file1),
+                    "File 2": os.path.basename(file2),
+                    "Similarity (%)": round(similarity_percentage, 1)
+                })
+                continue
             
             # Display results in UI
             st.markdown("---")
@@ -131,6 +166,57 @@ def generate_peer_comparison(temp_files):
                     f"{similarity_percentage:.1f}%",
                     delta=None
                 )
+
+    if table_rows:
+        st.markdown("### 📄 Similarity Results")
+        st.caption(f"Closest {DEFAULT_TOP_K} peers of each file, most similar pairs first")
+        st.dataframe(pd.DataFrame(table_rows), hide_index=True)
+
+    # Show the passages copied between files, longest first
+    copied = compare_passages(temp_files, texts=texts, boilerplate=boilerplate)
+    if copied:
+        st.markdown("### ✂️ Copied Passages")
+    for (file1, file2), match in sorted(copied.items(), key=lambda item: -item[1]["similarity"]):
+        passages = sorted(match["passages"], key=lambda passage: passage["spans"][0][0] - passage["spans"][0][1])
+        with st.expander(
+            f"{os.path.basename(file1)} and {os.path.basename(file2)}: "
+            f"{len(passages)} passage(s), {match['similarity'] * 100:.1f}% of the shorter file"
+        ):
+            for passage in passages[:MAX_SHOWN_PASSAGES]:
+                (start1, end1), (start2, end2) = passage["spans"]
+                repeats = f", repeated {passage['occurrences']} times" if passage["occurrences"] > 1 else ""
+                st.caption(f"Characters {start1}-{end1} of {os.path.basename(file1)}, "
+                           f"{start2}-{end2} of {os.path.basename(file2)}{repeats}")
+                st.text(passage["text"])
+            if len(passages) > MAX_SHOWN_PASSAGES:
+                st.caption(f"{len(passages) - MAX_SHOWN_PASSAGES} shorter passage(s) not shown")
+        peer_results.append(
+            f"Copied passages between {os.path.basename(file1)} and {os.path.basename(file2)}: "
+            f"{len(passages)} ({match['similarity'] * 100:.1f}% of the shorter file)\n"
+        )
+
+    # Check the uploads against earlier batches, then remember them for later ones
+    names = [os.path.basename(file)[len("temp_"):] if os.path.basename(file).startswith("temp_")
+             else os.path.basename(file) for file in temp_files]
+    # Without an assignment label the batch is derived from the uploads, so re-running the
+    # checks in a new session does not match the uploads with themselves
+    history = compare_with_history(temp_files, names, batch=batch or None, texts=texts)
+    history_rows = []
+    for name, file in zip(names, temp_files):
+        for match in history[file]:
+            history_rows.append({
+                "File": name,
+                "Earlier Submission": match["name"],
+                "Batch": match["batch"] or "",
+                "Estimated Overlap (%)": round(match["similarity"] * 100, 1)
+            })
+            peer_results.append(
+                f"{name} closely matches earlier submission {match['name']} ({match['batch']})\n"
+                f"Estimated Overlap: {match['similarity'] * 100:.1f}%\n"
+            )
+    if history_rows:
+        st.markdown("### 🗂️ Matches with Earlier Submissions")
+        st.dataframe(pd.DataFrame(history_rows), hide_index=True)
     
     if peer_results:
         return [{
@@ -139,12 +225,12 @@ def generate_peer_comparison(temp_files):
         }]
     return []
 
-def generate_plagiarism_check(temp_files):
+def generate_plagiarism_check(temp_files, texts):
     """Generate plagiarism check section for the report"""
     plagiarism_results_list = []
     st.markdown("### 🔍 Plagiarism Check Results")
     
-    plagiarism_results = check_plagiarism(temp_files)
+    plagiarism_results = check_plagiarism(temp_files, texts)
     for file_path, result in plagiarism_results.items():
         st.markdown(f"**File: {os.path.basename(file_path)}**")
         st.info(result)
@@ -159,12 +245,12 @@ def generate_plagiarism_check(temp_files):
         }]
     return []
 
-def generate_ai_detection(temp_files):
+def generate_ai_detection(temp_files, texts):
     """Generate AI detection section for the report"""
     ai_results_list = []
     st.markdown("### 🤖 AI Content Detection Results")
     
-    ai_results = detect_ai_content(temp_files)
+    ai_results = detect_ai_content(temp_files, texts)
     for file_path, result in ai_results.items():
         filename = os.path.basename(file_path)
         if result['status'] == 'success':
@@ -198,6 +284,8 @@ def generate_ai_detection(temp_files):
 
 def process_omr(answer_sheet, correct_sheet):
     """Process OMR sheets and return marks"""
+    import cv2
+
     try:
         # Read the images
         answer_img = cv2.imdecode(np.frombuffer(answer_sheet.read(), np.uint8), cv2.IMREAD_COLOR)
@@ -319,6 +407,19 @@ def main():
             help="Upload a single answer key file"
         )
 
+        # Keys evaluated before are kept in the key library and load without re-analysis
+        saved_keys = get_key_library().names()
+        library_key = None
+        if saved_keys and not answer_key:
+            library_key = st.selectbox(
+                "Or Use a Saved Answer Key",
+                ["(none)"] + saved_keys,
+                key="library_key",
+                help="Answer keys from earlier sessions, already analyzed"
+            )
+            if library_key == "(none)":
+                library_key = None
+
         # Add OCR button for answer key
         if answer_key and is_image_file(answer_key.name) and answer_key.name not in st.session_state.ocr_results:
             if st.button("Convert Answer Key to Text (OCR)", key="ocr_key_button"):
@@ -373,58 +474,80 @@ def main():
         st.session_state.checkboxes['plagiarism_check'] = plagiarism_check
         st.session_state.checkboxes['ai_detection'] = ai_detection
 
+        assignment_label = st.text_input(
+            "Assignment",
+            help="Label stored with these submissions for later plagiarism checks, e.g. the course and assignment",
+            key='assignmentlabel'
+        ).strip()
+        per_question = st.checkbox(
+            "Score Each Question Separately",
+            help="Split numbered answer scripts (1., 2., ...) into questions and score each one",
+            key='perquestioncheck'
+        )
+        fast_preprocessing = st.checkbox(
+            "Fast Preprocessing",
+            help="Filter stop words and punctuation without a full spaCy parse (same scores, faster on large classes)",
+            key='fastpreprocesscheck'
+        )
+        preprocess_mode = "lite" if fast_preprocessing else None
+
         if st.button("Evaluate Answers"):
-            if not student_answers or not answer_key:
+            if not student_answers or not (answer_key or library_key):
                 st.error("Please upload both student answers and answer key files!")
             else:
-                # Save answer key temporarily
-                temp_key_file = f"temp_key_{answer_key.name}"
-                
-                # Use OCR result if available, otherwise use original file
-                if answer_key.name in st.session_state.ocr_results:
-                    with open(temp_key_file, "w", encoding='utf-8') as f:
-                        f.write(st.session_state.ocr_results[answer_key.name])
+                # Evaluate the uploads in memory, using OCR results where available
+                if not answer_key:
+                    answer_key_content = None
+                elif answer_key.name in st.session_state.ocr_results:
+                    answer_key_content = st.session_state.ocr_results[answer_key.name]
                 else:
-                    with open(temp_key_file, "wb") as f:
-                        f.write(answer_key.getbuffer())
-
-                # Read the answer key content for reuse with error handling
-                try:
-                    with open(temp_key_file, "r", encoding='utf-8') as f:
-                        answer_key_content = f.read().strip()
-                except UnicodeDecodeError:
-                    with open(temp_key_file, "r", encoding='latin-1') as f:
-                        answer_key_content = f.read().strip()
+                    answer_key_content = answer_key.getvalue()
 
-                # Process each student answer
-                results_data = []
+                student_answer_contents = []
                 for student_answer in student_answers:
-                    st.write(f"### Evaluating: {student_answer.name}")
-                    
-                    # Save student answer temporarily
-                    temp_student_file = f"temp_student_{student_answer.name}"
-                    
-                    # Use OCR result if available, otherwise use original file
                     if student_answer.name in st.session_state.ocr_results:
-                        with open(temp_student_file, "w", encoding='utf-8') as f:
-                            f.write(st.session_state.ocr_results[student_answer.name])
+                        student_answer_contents.append(st.session_state.ocr_results[student_answer.name])
                     else:
-                        with open(temp_student_file, "wb") as f:
-                            f.write(student_answer.getbuffer())
-
-                    # Read the student answer content for reuse with error handling
-                    try:
-                        with open(temp_student_file, "r", encoding='utf-8') as f:
-                            student_answer_content = f.read().strip()
-                    except UnicodeDecodeError:
-                        with open(temp_student_file, "r", encoding='latin-1') as f:
-                            student_answer_content = f.read().strip()
-
-                    # Evaluate answers
-                    result = evaluate_answers(temp_student_file, temp_key_file)
+                        student_answer_contents.append(student_answer.getvalue())
+
+                # Evaluate all answers against the answer key analyzed once
+                feature_cache = get_feature_cache()
+                with st.spinner("Evaluating answers..."):
+                    # Load the analyzed key from the library, saving newly uploaded keys to it
+                    key_profile = load_key_profile(
+                        answer_key.name if answer_key else library_key, answer_key_content,
+                        cache=feature_cache, preprocess=preprocess_mode
+                    )
+                    if key_profile is not None:
+                        answer_key_content = key_profile
+                    if per_question:
+                        # Only questions whose text changed since the last run are rescored
+                        evaluation_results = []
+                        for student_answer, content in zip(student_answers, student_answer_contents):
+                            result = evaluate_by_question(
+                                content, key_profile.text if key_profile else answer_key_content,
+                                cache=feature_cache, preprocess=preprocess_mode,
+                                previous=st.session_state.question_results.get(student_answer.name)
+                            )
+                            st.session_state.question_results[student_answer.name] = result
+                            evaluation_results.append(result)
+                    else:
+                        evaluation_results = evaluate_batch(
+                            answer_key_content, student_answer_contents, cache=feature_cache,
+                            profiler=get_profiler(), preprocess=preprocess_mode
+                        )
+                if PROFILE_PATH:
+                    get_profiler().to_json(PROFILE_PATH)
+                cache_stats = feature_cache.stats()
+                st.caption(
+                    f"Feature cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                    f"({cache_stats['entries']} cached texts)"
+                )
 
-                    # Clean up student answer file
-                    os.remove(temp_student_file)
+                # Process each student answer
+                results_data = []
+                for student_answer, result in zip(student_answers, evaluation_results):
+                    st.write(f"### Evaluating: {student_answer.name}")
 
                     # Display results
                     if result["status"] == "success":
@@ -447,6 +570,17 @@ def main():
                             # Display detailed metrics
                             for detail in result["details"]:
                                 st.write(detail)
+
+                            # Display per-question scores
+                            if result.get("questions"):
+                                st.dataframe(pd.DataFrame([
+                                    {
+                                        "Question": number,
+                                        "Score (%)": round(question["overall_score"], 1),
+                                        "Category": question.get("similarity_category", question.get("message", ""))
+                                    }
+                                    for number, question in result["questions"].items()
+                                ]), hide_index=True)
                                 
                             # Add note about semantic similarity recognition
                             if result["similarity_category"] in ["high", "very_high"]:
@@ -506,14 +640,19 @@ def main():
                             temp_files.append(temp_file)
 
                         results_data = []
+                        # Extract every file once for all selected checks; the LLM checks
+                        # alone only need the prompt-sized prefix of each file
+                        texts = extract_texts(temp_files, max_chars=None if peer_comparison else PROMPT_CHAR_LIMIT)
                     
                         # Generate report sections based on selected options
                         if peer_comparison:
-                            results_data.extend(generate_peer_comparison(temp_files))
+                            # Passages quoted from the answer key are not copying
+                            key_text = [key_profile.text] if key_profile is not None else []
+                            results_data.extend(generate_peer_comparison(temp_files, texts, key_text, assignment_label))
                         if plagiarism_check:
-                            results_data.extend(generate_plagiarism_check(temp_files))
+                            results_data.extend(generate_plagiarism_check(temp_files, texts))
                         if ai_detection:
-                            results_data.extend(generate_ai_detection(temp_files))
+                            results_data.extend(generate_ai_detection(temp_files, texts))
 
                         # Generate and offer PDF download
                         if results_data:
@@ -565,9 +704,6 @@ def main():
                 #             for content in section['content']:
                 #                 st.write(content)
 
-                # Clean up answer key file
-                os.remove(temp_key_file)
-
     # Assignment Verification Tab
     with tab2:
         st.header("Assignment Verification")
@@ -630,6 +766,12 @@ def main():
         st.session_state.checkboxes['plagiarism_check'] = plagiarism_check
         st.session_state.checkboxes['ai_detection'] = ai_detection
 
+        assignment_label = st.text_input(
+            "Assignment",
+            help="Label stored with these submissions for later plagiarism checks, e.g. the course and assignment",
+            key='assignment_label'
+        ).strip()
+
         # Action buttons
         col1, col2 = st.columns(2)
         with col1:
@@ -716,14 +858,17 @@ def main():
                             temp_files.append(temp_file)
 
                         results_data = []
+                        # Extract every file once for all selected checks; the LLM checks
+                        # alone only need the prompt-sized prefix of each file
+                        texts = extract_texts(temp_files, max_chars=None if peer_comparison else PROMPT_CHAR_LIMIT)
                     
                         # Generate report sections based on selected options
                         if peer_comparison:
-                            results_data.extend(generate_peer_comparison(temp_files))
+                            results_data.extend(generate_peer_comparison(temp_files, texts, batch=assignment_label))
                         if plagiarism_check:
-                            results_data.extend(generate_plagiarism_check(temp_files))
+                            results_data.extend(generate_plagiarism_check(temp_files, texts))
                         if ai_detection:
-                            results_data.extend(generate_ai_detection(temp_files))
+                            results_data.extend(generate_ai_detection(temp_files, texts))
 
                         # Generate and offer PDF download
                         if results_data:
@@ -788,7 +933,7 @@ def main():
         
         # Configure button
         if st.button("Configure OMR Format"):
-            if st.session_state.omr_processor.configure(questions_count, options_count):
+            if get_omr_processor().configure(questions_count, options_count):
                 st.success(f"✅ OMR format configured: {questions_count} questions with {options_count} options each")
             else:
                 st.error("Failed to configure OMR format")
@@ -813,13 +958,13 @@ def main():
         )
         
         if st.button("Evaluate OMR Sheets"):
-            if not st.session_state.omr_processor.is_configured:
+            if not get_omr_processor().is_configured:
                 st.error("Please configure the OMR format first!")
             elif not correct_omr or not student_omr_sheets:
                 st.error("Please upload both correct answer sheet and student answer sheets!")
             else:
                 # Process answer key first
-                if st.session_state.omr_processor.process_answer_key(correct_omr.getvalue()):
+                if get_omr_processor().process_answer_key(correct_omr.getvalue()):
                     st.success("✅ Answer key processed successfully!")
                     st.markdown("### 📊 OMR Evaluation Results")
                     
@@ -830,7 +975,7 @@ def main():
                     for student_sheet in student_omr_sheets:
                         st.write(f"### Evaluating: {student_sheet.name}")
                         
-                        result = st.session_state.omr_processor.evaluate_answer_sheet(student_sheet.getvalue())
+                        result = get_omr_processor().evaluate_answer_sheet(student_sheet.getvalue())
                         
                         if result["status"] == "success":
                             # Display results
@@ -0,0 +1 @@
+# Keeps the repository root importable (``modules.*``) when pytest runs the tests/ directory
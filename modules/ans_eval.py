@@ -1,97 +1,589 @@
-import spacy
 from difflib import SequenceMatcher
+from functools import lru_cache
+import codecs
+import hashlib
 import re
+import unicodedata
+import os
+import pickle
 import logging
-import en_core_web_sm
-from collections import Counter
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from types import SimpleNamespace
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from modules.embeddings import ChunkPooler, EmbeddingBackend, create_backend, iter_chunks
+from modules.feature_cache import DEFAULT_CACHE_DIR, FeatureCache
+from modules.key_library import KeyLibrary
+from modules.profiling import active_profiler, stage as profile_stage
+from modules.registry import get_resource
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load spaCy model
-nlp = en_core_web_sm.load()
+def _load_nlp():
+    """
+    Load the spaCy model (imported here so importing this module stays fast)
+    """
+    import en_core_web_sm
+    return en_core_web_sm.load()
+
+def get_nlp():
+    """
+    Shared spaCy model, loaded on first use
+    """
+    return get_resource("spacy:en_core_web_sm", _load_nlp)
+
+def _load_tfidf_analyzer():
+    """
+    Same tokenization as the TF-IDF vectorizer, used to precompute term counts
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(min_df=1, stop_words='english').build_analyzer()
+
+def get_tfidf_analyzer():
+    """
+    Shared TF-IDF analyzer, built on first use
+    """
+    return get_resource("sklearn:tfidf_analyzer", _load_tfidf_analyzer)
 
-def preprocess_text(text):
+def get_feature_cache():
+    """
+    Shared on-disk feature cache, opened on first use
+    """
+    return get_resource("cache:features", FeatureCache)
+
+def get_key_library():
+    """
+    Shared library of analyzed answer keys, opened on first use
+    """
+    return get_resource("library:keys", KeyLibrary)
+
+def get_embedding_backend(name=None):
+    """
+    Shared embedding backend, created on first use
+    Sentence-transformer vectors are kept in a memory-mapped store under the cache directory
+    """
+    name = name or EMBEDDING_BACKEND
+    store_dir = os.path.join(DEFAULT_CACHE_DIR, "vectors", name)
+    return get_resource(f"embedding:{name}", lambda: create_backend(name, store_dir=store_dir))
+
+def feature_version(preprocess=None):
+    """
+    Version string of the analyzed features, part of every feature cache key
+    Bump FEATURE_VERSION whenever analyze_texts changes what it produces
+    :param preprocess: Preprocessing mode the features are computed with (defaults to PREPROCESS_MODE)
+    """
+    try:
+        model_version = metadata.version("en_core_web_sm")
+    except metadata.PackageNotFoundError:
+        model_version = "unknown"
+    version = f"features-{FEATURE_VERSION}/en_core_web_sm-{model_version}/embedding-{EMBEDDING_POOLING}-{EMBEDDING_CHAR_LIMIT}"
+    # Lite sentence boundaries can chunk long embeddings differently, so lite features are cached apart
+    if (preprocess or PREPROCESS_MODE) == "lite":
+        version += "/preprocess-lite"
+    return version
+
+def __getattr__(name):
+    """
+    Keep ans_eval.nlp working for existing callers without loading spaCy at import time
+    """
+    if name == "nlp":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Version of the features produced by analyze_texts, used in feature cache keys
+FEATURE_VERSION = 2
+
+# Version of the component similarities; stored component scores and per-question
+# results of another version are not reused. Bump whenever a component changes scale.
+SCORING_VERSION = 3
+
+# Long answers are embedded as sentence-aligned chunks of at most this many
+# preprocessed characters, pooled into one document vector ("mean" or "max")
+EMBEDDING_CHAR_LIMIT = 5000
+EMBEDDING_POOLING = "mean"
+
+# Embedding backend used for bulk semantic similarity ("spacy", "sentence-transformers", ...)
+EMBEDDING_BACKEND = os.getenv("SAS_EMBEDDING_BACKEND", "spacy")
+
+# Phrase/sentence matching: above this many pairs, candidates are bounded with a
+# bit-parallel subsequence index first and only those that can pass are aligned.
+# The bound is exact but still touches every pair: O(L1 * L2 / 64) word operations for
+# L1 and L2 characters of strings on each side, quadratic in answer length
+INDEXED_MATCH_MIN_PAIRS = 2500
+
+# Sequence similarity: answers up to this many characters get the exact character ratio;
+# longer ones are cut into aligned segments of about this size, preferably at the
+# SEQUENCE_ANCHOR_SIZE-token n-grams that occur once in both
+SEQUENCE_CHAR_LIMIT = 4000
+SEQUENCE_ANCHOR_SIZE = 3
+
+# Component similarities blended into the final score, in storage order
+COMPONENTS = ("content", "semantic", "tfidf", "phrase", "structure", "sequence")
+
+# Weights and adjustments of the final score blend (see combine_similarity)
+SCORING_CONFIG = {
+    "weights": {
+        "content": 0.25,     # Content overlap
+        "semantic": 0.30,    # Semantic similarity (highest weight)
+        "tfidf": 0.20,       # TF-IDF similarity
+        "phrase": 0.15,      # Key phrase matching
+        "structure": 0.05,   # Document structure
+        "sequence": 0.05     # Sequence matching
+    },
+    # Boost semantically similar answers that use different wording
+    "semantic_boost": 1.3,
+    "boost_min_semantic": 0.7,
+    "boost_max_content": 0.5,
+    # Penalize answers with very low content and semantic overlap
+    "penalty": 0.3,
+    "penalty_max_content": 0.05,
+    "penalty_max_semantic": 0.2,
+    # Stretch scores above curve_start by curve_factor
+    "curve_start": 60,
+    "curve_factor": 1.2,
+    # Cap the score of very different answers
+    "cap": 10,
+    "cap_max_content": 0.02,
+    "cap_max_semantic": 0.2
+}
+
+# Bulk parsing settings (worker processes can be raised on multi-core graders)
+NLP_BATCH_SIZE = 64
+NLP_PROCESSES = int(os.getenv("SAS_NLP_PROCESSES", "1"))
+
+# Worker processes scoring question pairs of segmented answer scripts
+SCORING_WORKERS = int(os.getenv("SAS_SCORING_WORKERS", "1"))
+
+# Numbered question headings at the start of a line: "1.", "2)", "Q3:", "Question 4."
+QUESTION_HEADING = re.compile(r'^[ \t]*(?:Q(?:uestion)?[ \t]*)?(\d{1,3})[ \t]*[.):](?!\d)', re.IGNORECASE | re.MULTILINE)
+
+# Preprocessing mode: "spacy" parses the cleaned text; "lite" tokenizes it with
+# precompiled regexes and produces the same processed text without the parser
+PREPROCESS_MODE = os.getenv("SAS_PREPROCESS_MODE", "spacy")
+
+# Stop words kept during preprocessing
+NEGATIONS = frozenset({'not', 'no', 'never', 'cannot'})
+
+# Lite preprocessing: whitespace runs and sentence-ending punctuation split the text,
+# and all-letter words that are not tokenizer special cases are single tokens
+WHITESPACE_RUN = re.compile(r'(\s+)')
+PLAIN_WORD = re.compile(r'[^\W\d_]+')
+SENTENCE_END = re.compile(r'[.!?]+')
+
+# Pipeline components each parsing pass can skip
+PIPELINE_DISABLE = {
+    # Sentence boundaries and lexical attributes only need the parser
+    "preprocess": ["tagger", "attribute_ruler", "lemmatizer", "ner"],
+    # Concepts, noun phrases and structure use the full pipeline
+    "features": [],
+    # Document vectors come from the tok2vec tensor alone
+    "embedding": ["tagger", "parser", "attribute_ruler", "lemmatizer", "ner"]
+}
+
+class AnalyzedText:
+    """
+    Parse-once view of a text holding every feature the similarity methods read
+    """
+    def __init__(self, text, processed, lemmas, noun_chunks, entities, sentences, noun_phrases,
+                 structure, vector, vector_norm, token_count, embedding_text, terms):
+        self.text = text
+        self.processed = processed
+        self.lemmas = lemmas
+        self.noun_chunks = noun_chunks
+        self.entities = entities
+        self.sentences = sentences
+        self.noun_phrases = noun_phrases
+        self.structure = structure
+        self.vector = vector
+        self.vector_norm = vector_norm
+        self.token_count = token_count
+        self.embedding_text = embedding_text
+        self.terms = terms
+
+    @property
+    def concepts(self):
+        """Key concepts as returned by extract_key_concepts"""
+        return self.lemmas + self.noun_chunks + self.entities
+
+    def to_dict(self):
+        """Plain dict of all features, suitable for caching or serialization"""
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an AnalyzedText from to_dict() output"""
+        return cls(**data)
+
+def analyze_text(text, preprocess=None):
+    """
+    Parse a text once for each form the similarity methods need (cleaned, raw and
+    preprocessed) and collect all derived features into an AnalyzedText
+    """
+    return analyze_texts([text], preprocess=preprocess)[0]
+
+def analyze_texts(texts, n_process=None, batch_size=NLP_BATCH_SIZE, cache=None, preprocess=None):
+    """
+    Analyze many texts at once by streaming them through spaCy in batches
+    Each pass only runs the pipeline components its features need
+    :param texts: Iterable of texts to analyze
+    :param n_process: Number of spaCy worker processes (defaults to NLP_PROCESSES)
+    :param batch_size: Number of texts per spaCy batch
+    :param cache: Optional FeatureCache consulted before parsing and filled afterwards
+    :param preprocess: Preprocessing mode, "spacy" or "lite" (defaults to PREPROCESS_MODE)
+    :return: List of AnalyzedText in input order
+    """
+    texts = [str(text) if text else "" for text in texts]
+    if not texts:
+        return []
+    if cache is None:
+        return _analyze_uncached(texts, n_process, batch_size, preprocess)
+    
+    # Only parse the texts whose features are not cached yet
+    version = feature_version(preprocess)
+    keys = [FeatureCache.make_key(text, version) for text in texts]
+    with profile_stage("cache"):
+        cached = cache.get_many(keys)
+    
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached:
+            missing.setdefault(key, text)
+    if missing:
+        analyzed = _analyze_uncached(list(missing.values()), n_process, batch_size, preprocess)
+        computed = {key: result.to_dict() for key, result in zip(missing, analyzed)}
+        with profile_stage("cache"):
+            cache.put_many(computed)
+        cached.update(computed)
+    
+    return [AnalyzedText.from_dict(cached[key]) for key in keys]
+
+def _analyze_uncached(texts, n_process, batch_size, preprocess=None):
+    """
+    Parse and analyze a list of strings with spaCy
+    """
+    n_process = max(1, min(n_process or NLP_PROCESSES, len(texts)))
+    
+    # Cleaned text parse (or lite tokenization) feeds preprocessing
+    for text in texts:
+        if not text:
+            logger.warning("Empty text input")
+    with profile_stage("preprocess"):
+        cleaned = [_clean_text(text) for text in texts]
+        if _preprocess_mode(preprocess) == "lite":
+            processed_sentences = [_lite_sentences(clean) if text else [] for text, clean in zip(texts, cleaned)]
+        else:
+            processed_sentences = [
+                _preprocessed_sentences(clean, doc) if text else []
+                for text, clean, doc in zip(texts, cleaned, _pipe(cleaned, "preprocess", n_process, batch_size))
+            ]
+        processed = [' '.join(sentences) for sentences in processed_sentences]
+    
+    # Raw text parse feeds concepts, phrases and structure
+    features = []
+    with profile_stage("parse"):
+        for text, doc in zip(texts, _pipe(texts, "features", n_process, batch_size)):
+            lemmas, noun_chunks, entities = _concept_parts(doc)
+            sentences, noun_phrases = _phrase_parts(doc)
+            features.append((lemmas, noun_chunks, entities, sentences, noun_phrases, _structure_features(text, doc)))
+    
+    # Preprocessed text chunks feed the embedding
+    with profile_stage("embedding"):
+        embedded = _embed(processed_sentences, n_process, batch_size)
+    
+    # Term counts feed TF-IDF
+    with profile_stage("tfidf"):
+        analyzer = get_tfidf_analyzer()
+        terms = [Counter(analyzer(text)) for text in processed]
+    
+    analyzed = []
+    for i, (vector, vector_norm, token_count) in enumerate(embedded):
+        lemmas, noun_chunks, entities, sentences, noun_phrases, structure = features[i]
+        analyzed.append(AnalyzedText(
+            text=texts[i],
+            processed=processed[i],
+            lemmas=lemmas,
+            noun_chunks=noun_chunks,
+            entities=entities,
+            sentences=sentences,
+            noun_phrases=noun_phrases,
+            structure=structure,
+            vector=vector,
+            vector_norm=vector_norm,
+            token_count=token_count,
+            embedding_text=processed[i],
+            terms=terms[i]
+        ))
+    
+    return analyzed
+
+def _pipe(texts, stage, n_process=1, batch_size=NLP_BATCH_SIZE, as_tuples=False):
+    """
+    Stream texts through spaCy with the components a parsing stage does not need disabled
+    """
+    return get_nlp().pipe(
+        texts, disable=PIPELINE_DISABLE[stage], n_process=n_process, batch_size=batch_size, as_tuples=as_tuples
+    )
+
+def _embed(sentence_lists, n_process=1, batch_size=NLP_BATCH_SIZE):
+    """
+    Embed each document as pooled sentence-aligned chunks of at most EMBEDDING_CHAR_LIMIT
+    characters, so the whole answer counts while spaCy memory stays flat
+    :param sentence_lists: One list of preprocessed sentences per document
+    :return: List of (vector, vector_norm, token_count) per document
+    """
+    def chunks():
+        for i, sentences in enumerate(sentence_lists):
+            empty = True
+            for chunk in iter_chunks(sentences, EMBEDDING_CHAR_LIMIT):
+                empty = False
+                yield chunk, i
+            if empty:
+                # Empty documents still get a (zero) vector, like parsing an empty string
+                yield "", i
+    
+    poolers = [ChunkPooler(EMBEDDING_POOLING) for _ in sentence_lists]
+    for doc, i in _pipe(chunks(), "embedding", n_process, batch_size, as_tuples=True):
+        poolers[i].add(doc.vector, len(doc))
+    
+    embedded = []
+    for pooler in poolers:
+        vector = pooler.result()
+        embedded.append((vector, _vector_norm(vector), pooler.weight))
+    return embedded
+
+def _vector_norm(vector):
+    """
+    L2 norm computed like spaCy's Doc.vector_norm (float32 squares summed in order as doubles)
+    """
+    squares = np.square(np.asarray(vector, dtype=np.float32)).astype(np.float64)
+    return float(np.sqrt(np.add.accumulate(squares)[-1])) if squares.size else 0.0
+
+def load_key_profile(name, answer_key=None, library=None, cache=None, preprocess=None):
+    """
+    Analyzed answer key from the key library, so a key reused across sections and terms
+    is parsed once; on a miss the key is analyzed and saved under name
+    :param name: Name the key is stored under, e.g. its file name
+    :param answer_key: Key text or raw file bytes; a stored profile of a different text is replaced
+    :param library: KeyLibrary to use (defaults to the shared one)
+    :param cache: Optional FeatureCache used when the key has to be analyzed
+    :param preprocess: Preprocessing mode, "spacy" or "lite" (defaults to PREPROCESS_MODE)
+    :return: AnalyzedText, or None if the key is not stored and no usable text was given
+    """
+    library = library or get_key_library()
+    version = feature_version(preprocess)
+    text = decode_text(answer_key).strip() if answer_key is not None else None
+    
+    with profile_stage("key_profile"):
+        features = library.load(name, version, text)
+        if features is None and text is None:
+            # Stored with other features: re-analyze the stored key text
+            stored = library.load(name)
+            text = stored["text"] if stored else None
+    if features is not None:
+        return AnalyzedText.from_dict(features)
+    if not text or len(text) < 10:
+        return None
+    
+    analyzed = analyze_texts([text], cache=cache, preprocess=preprocess)[0]
+    library.save(name, text, analyzed.to_dict(), version)
+    return analyzed
+
+def preprocess_text(text, mode=None):
     """
     Enhanced text preprocessing with better handling of document structure and domain-specific terminology
+    :param mode: "spacy" to parse the text, or "lite" for the regex fast path with the same
+        output (defaults to PREPROCESS_MODE)
     """
     if not text:
         logger.warning("Empty text input")
         return ""
     
     # Convert to string (in case of non-string input)
-    text = str(text)
+    text = _clean_text(text)
     
+    # Process document in sentences to maintain context
+    if _preprocess_mode(mode) == "lite":
+        return ' '.join(_lite_sentences(text))
+    return ' '.join(_preprocessed_sentences(text, next(_pipe([text], "preprocess"))))
+
+def _preprocess_mode(mode):
+    """
+    Validate a preprocessing mode, defaulting to PREPROCESS_MODE
+    """
+    mode = mode or PREPROCESS_MODE
+    if mode not in ("spacy", "lite"):
+        raise ValueError(f"Unknown preprocessing mode: {mode}")
+    return mode
+
+def _clean_text(text):
+    """
+    Lowercase a text and strip characters and formatting artifacts before parsing
+    """
     # Convert to lowercase before any processing
-    text = text.lower()
+    text = str(text).lower()
     
     # Preserve sentence structure for better analysis
     # Remove non-alphanumeric except for sentence punctuation
     text = re.sub(r'[^\w\s.,;:!?-]', '', text)
     
     # Remove bullet points and common formatting artifacts
-    text = re.sub(r'●|○|\*|\d+\.\s', '', text)
-    
-    # Process document in sentences to maintain context
-    doc = nlp(text)
+    return re.sub(r'●|○|\*|\d+\.\s', '', text)
+
+def _preprocessed_sentences(text, doc):
+    """
+    Drop stop words and punctuation from the parse of an already cleaned text
+    Returns the processed sentences, which joined with spaces give the processed text
+    """
     processed_sentences = []
     
     for sent in doc.sents:
         # Filter out stop words for each sentence but preserve important domain-specific terms
         filtered_tokens = [token.text for token in sent 
-                          if (not token.is_stop or token.text in ['not', 'no', 'never', 'cannot']) 
+                          if (not token.is_stop or token.text in NEGATIONS) 
                           and not token.is_punct and len(token.text) > 1]
         if filtered_tokens:
             processed_sentences.append(' '.join(filtered_tokens))
     
     # If all content was filtered out, fall back to basic processing
     if not processed_sentences:
-        # Basic fallback preprocessing
-        words = [word for word in text.split() if len(word) > 1]
-        stop_words = set(nlp.Defaults.stop_words) - {'not', 'no', 'never', 'cannot'}  # Preserve negations
-        words = [word for word in words if word not in stop_words]
-        return ' '.join(words)
+        return _fallback_sentences(text)
+    
+    return processed_sentences
+
+def _fallback_sentences(text):
+    """
+    Basic preprocessing for texts whose tokens were all filtered out
+    """
+    words = [word for word in text.split() if len(word) > 1]
+    stop_words = get_lite_preprocessor().stop_words - NEGATIONS  # Preserve negations
+    words = [word for word in words if word not in stop_words]
+    return [' '.join(words)] if words else []
+
+def _load_lite_preprocessor():
+    """
+    Frozen stop words and tokenizer special cases of the spaCy model, for lite preprocessing
+    """
+    nlp = get_nlp()
+    tokenizer = nlp.tokenizer
+    
+    @lru_cache(maxsize=65536)
+    def tokenize(span):
+        return tuple(token.text for token in tokenizer(span))
+    
+    return SimpleNamespace(
+        stop_words=frozenset(nlp.Defaults.stop_words),
+        special_cases=frozenset(tokenizer.rules),
+        tokenize=tokenize
+    )
+
+def get_lite_preprocessor():
+    """
+    Shared lite preprocessing tables, built on first use
+    """
+    return get_resource("preprocess:lite", _load_lite_preprocessor)
+
+def _lite_tokens(text):
+    """
+    Split a cleaned text into the same tokens as the spaCy tokenizer
+    Whitespace runs follow spaCy's rules (a leading space belongs to the previous token,
+    the rest of the run is a token); plain words are single tokens, and the rare spans
+    with punctuation, digits or special cases are tokenized by spaCy once and memoized
+    """
+    lite = get_lite_preprocessor()
+    pieces = WHITESPACE_RUN.split(text)
+    for i, piece in enumerate(pieces):
+        if not piece:
+            continue
+        if i % 2:
+            # Whitespace run; one leading space after a token is that token's trailing space
+            if i > 1 or pieces[0]:
+                if piece[0] == ' ':
+                    piece = piece[1:]
+            if piece:
+                yield piece
+        elif PLAIN_WORD.fullmatch(piece) and piece not in lite.special_cases:
+            yield piece
+        else:
+            yield from lite.tokenize(piece)
+
+def _lite_sentences(text):
+    """
+    Regex counterpart of _preprocessed_sentences: drop stop words and punctuation from
+    a cleaned text without parsing it, giving the same processed text
+    Sentences end at sentence punctuation and line breaks instead of parser boundaries
+    """
+    stop_words = get_lite_preprocessor().stop_words
+    processed_sentences = []
+    filtered_tokens = []
+    for token in _lite_tokens(text):
+        if (token.lower() not in stop_words or token in NEGATIONS) \
+                and len(token) > 1 and not _is_punct(token):
+            filtered_tokens.append(token)
+        elif SENTENCE_END.fullmatch(token) or "\n" in token:
+            if filtered_tokens:
+                processed_sentences.append(' '.join(filtered_tokens))
+            filtered_tokens = []
+    if filtered_tokens:
+        processed_sentences.append(' '.join(filtered_tokens))
+    
+    # If all content was filtered out, fall back to basic processing
+    if not processed_sentences:
+        return _fallback_sentences(text)
     
-    return ' '.join(processed_sentences)
+    return processed_sentences
+
+@lru_cache(maxsize=4096)
+def _is_punct(token):
+    """
+    Punctuation check matching spaCy's is_punct lexical attribute
+    """
+    return all(unicodedata.category(char).startswith("P") for char in token)
 
 def extract_key_concepts(text):
     """
     Extract meaningful key concepts from text using NLP with improved domain awareness
     """
-    doc = nlp(text)
-    
+    lemmas, chunks, entities = _concept_parts(get_nlp()(text))
+    return lemmas + chunks + entities
+
+def _concept_parts(doc):
+    """
+    Split the key concepts of a parsed document into lemmas, noun phrases and entities
+    """
     # Extract nouns, proper nouns, verbs, and adjectives as key concepts
-    concepts = []
+    lemmas = []
     for token in doc:
         if token.pos_ in ["NOUN", "PROPN", "VERB", "ADJ"] and not token.is_stop and len(token.text) > 1:
-            concepts.append(token.lemma_.lower())
+            lemmas.append(token.lemma_.lower())
     
     # Also extract noun phrases and entity mentions
+    chunks = []
     for chunk in doc.noun_chunks:
         # Clean up the noun phrase
         clean_chunk = re.sub(r'[^\w\s]', '', chunk.text).lower().strip()
         if clean_chunk and len(clean_chunk) > 3:  # Ensure meaningful phrases
-            concepts.append(clean_chunk)
+            chunks.append(clean_chunk)
     
     # Add named entities as important concepts
+    entities = []
     for ent in doc.ents:
         clean_ent = re.sub(r'[^\w\s]', '', ent.text).lower().strip()
         if clean_ent and len(clean_ent) > 1:
-            concepts.append(clean_ent)
+            entities.append(clean_ent)
     
-    return concepts
+    return lemmas, chunks, entities
 
 def calculate_content_overlap(text1, text2):
     """
     Calculate meaningful content overlap between documents using key concepts
     """
     # Extract key concepts
-    concepts1 = extract_key_concepts(text1)
-    concepts2 = extract_key_concepts(text2)
+    concepts1 = text1.concepts if isinstance(text1, AnalyzedText) else extract_key_concepts(text1)
+    concepts2 = text2.concepts if isinstance(text2, AnalyzedText) else extract_key_concepts(text2)
     
     # Create frequency counters
     counter1 = Counter(concepts1)
@@ -116,11 +608,75 @@ def calculate_content_overlap(text1, text2):
     
     return dot_product / ((magnitude1 * magnitude2) ** 0.5)
 
+def concept_matrix(analyzed_texts):
+    """
+    Sparse concept count matrix with one row per analyzed text
+    :return: CSR matrix of shape (texts, concepts) and the concept vocabulary
+    """
+    from scipy.sparse import csr_matrix
+    
+    vocabulary = {}
+    indices = []
+    indptr = [0]
+    for analyzed in analyzed_texts:
+        for concept in analyzed.concepts:
+            indices.append(vocabulary.setdefault(concept, len(vocabulary)))
+        indptr.append(len(indices))
+    
+    matrix = csr_matrix(
+        (np.ones(len(indices)), indices, indptr),
+        shape=(len(indptr) - 1, len(vocabulary))
+    )
+    # Repeated concepts become counts
+    matrix.sum_duplicates()
+    return matrix, vocabulary
+
+def _normalized_rows(matrix):
+    """
+    Scale each row of a sparse matrix to unit length, leaving empty rows at zero
+    """
+    from scipy.sparse import diags
+    
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return diags(1.0 / norms) @ matrix
+
+def content_overlap_similarities(key_analyzed, students_analyzed):
+    """
+    Content overlap of every student answer with the key in one vectorized operation,
+    equal to calculate_content_overlap for each pair
+    :return: NumPy array with one similarity per student
+    """
+    matrix, _ = concept_matrix([key_analyzed] + list(students_analyzed))
+    matrix = _normalized_rows(matrix)
+    similarities = matrix[1:] @ matrix[0].T
+    return np.asarray(similarities.todense()).ravel()
+
+def content_overlap_matrix(analyzed_texts):
+    """
+    Pairwise content overlap between all analyzed texts, e.g. student against student
+    :return: Sparse symmetric matrix of cosine similarities between concept counts
+    """
+    matrix, _ = concept_matrix(analyzed_texts)
+    matrix = _normalized_rows(matrix)
+    return matrix @ matrix.T
+
 def calculate_tfidf_similarity(text1, text2):
     """
     Calculate TF-IDF based cosine similarity between texts
     This helps identify important terms and their relative importance
     """
+    if isinstance(text1, AnalyzedText) and isinstance(text2, AnalyzedText):
+        # Reuse the term counts computed when the texts were analyzed
+        return _term_tfidf_similarity(text1.terms, text2.terms)
+    if isinstance(text1, AnalyzedText):
+        text1 = text1.processed
+    if isinstance(text2, AnalyzedText):
+        text2 = text2.processed
+    
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    
     try:
         # Create TF-IDF vectorizer
         vectorizer = TfidfVectorizer(min_df=1, stop_words='english')
@@ -136,22 +692,106 @@ def calculate_tfidf_similarity(text1, text2):
         logger.error(f"Error in TF-IDF similarity calculation: {e}")
         return 0.0
 
+def _term_tfidf_similarity(terms1, terms2):
+    """
+    TF-IDF cosine similarity of two term count vectors, computed the way a
+    TfidfVectorizer fitted on just these two documents would
+    """
+    if not terms1 or not terms2:
+        return 0.0
+    
+    # Smoothed IDF over the two documents: shared terms get df=2, others df=1
+    idf_shared = np.log(3 / 3) + 1
+    idf_single = np.log(3 / 2) + 1
+    
+    def weights(terms, other):
+        return {term: count * (idf_shared if term in other else idf_single) for term, count in terms.items()}
+    
+    weights1 = weights(terms1, terms2)
+    weights2 = weights(terms2, terms1)
+    
+    dot_product = sum(weight * weights2[term] for term, weight in weights1.items() if term in weights2)
+    magnitude1 = sum(weight ** 2 for weight in weights1.values()) ** 0.5
+    magnitude2 = sum(weight ** 2 for weight in weights2.values()) ** 0.5
+    
+    return float(dot_product / (magnitude1 * magnitude2))
+
+def fit_corpus_tfidf(documents):
+    """
+    Fit one TF-IDF model on a whole evaluation corpus (the key plus every student answer)
+    so IDF reflects the cohort instead of a single pair of documents
+    :return: The fitted vectorizer and the L2-normalized sparse document matrix
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    
+    vectorizer = TfidfVectorizer(min_df=1, stop_words='english')
+    matrix = vectorizer.fit_transform(documents)
+    return vectorizer, matrix
+
+def save_tfidf_model(vectorizer, path):
+    """
+    Save a fitted TF-IDF model so later runs on the same exam can reuse its vocabulary
+    """
+    with open(path, 'wb') as f:
+        pickle.dump(vectorizer, f)
+
+def load_tfidf_model(path):
+    """
+    Load a TF-IDF model saved with save_tfidf_model
+    """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def corpus_tfidf_similarities(key_text, student_texts, model_path=None):
+    """
+    TF-IDF similarity of every student answer to the key from one corpus-level model
+    :param key_text: Preprocessed answer key
+    :param student_texts: List of preprocessed student answers
+    :param model_path: Optional file of a saved model; reused if it exists, written otherwise
+    :return: NumPy array with one similarity per student
+    """
+    documents = [key_text] + list(student_texts)
+    
+    if model_path and os.path.exists(model_path):
+        matrix = load_tfidf_model(model_path).transform(documents)
+    else:
+        vectorizer, matrix = fit_corpus_tfidf(documents)
+        if model_path:
+            save_tfidf_model(vectorizer, model_path)
+    
+    # Rows are L2-normalized, so one sparse matrix-vector product gives every cosine similarity
+    similarities = matrix[1:] @ matrix[0].T
+    return np.asarray(similarities.todense()).ravel()
+
 def calculate_embedding_similarity(text1, text2):
     """
     Calculate semantic similarity using word embeddings
     This captures deeper semantic relationships between texts
     """
     try:
-        # Process texts with spaCy
-        doc1 = nlp(text1[:5000])  # Limit text length to prevent memory issues
-        doc2 = nlp(text2[:5000])
-        
-        # If documents are empty after processing, return 0
-        if len(doc1) == 0 or len(doc2) == 0:
-            return 0.0
-        
-        # Calculate vector similarity
-        similarity = doc1.similarity(doc2)
+        if isinstance(text1, AnalyzedText) and isinstance(text2, AnalyzedText):
+            # Reuse the vectors computed when the texts were analyzed
+            if text1.token_count == 0 or text2.token_count == 0:
+                return 0.0
+            similarity = _vector_similarity(text1, text2)
+        else:
+            if isinstance(text1, AnalyzedText):
+                text1 = text1.processed
+            if isinstance(text2, AnalyzedText):
+                text2 = text2.processed
+            
+            # Process texts with spaCy in bounded-size chunks
+            embedded1, embedded2 = [
+                SimpleNamespace(vector=vector, vector_norm=vector_norm, token_count=token_count, embedding_text=text)
+                for text, (vector, vector_norm, token_count) in zip((text1, text2), _embed([[text1], [text2]]))
+            ]
+            
+            # If documents are empty after processing, return 0
+            if embedded1.token_count == 0 or embedded2.token_count == 0:
+                return 0.0
+            
+            # Calculate vector similarity
+            similarity = _vector_similarity(embedded1, embedded2)
         
         # Normalize to ensure it's between 0 and 1
         return max(0.0, min(1.0, similarity))
@@ -159,36 +799,31 @@ def calculate_embedding_similarity(text1, text2):
         logger.error(f"Error in embedding similarity calculation: {e}")
         return 0.0
 
+def _vector_similarity(analyzed1, analyzed2):
+    """
+    Cosine similarity of two analyzed texts, matching spaCy's Doc.similarity
+    """
+    # Identical token sequences are treated as a perfect match, as spaCy does
+    if analyzed1.embedding_text == analyzed2.embedding_text:
+        return 1.0
+    if analyzed1.vector_norm == 0 or analyzed2.vector_norm == 0:
+        return 0.0
+    return float(np.dot(analyzed1.vector, analyzed2.vector) / (analyzed1.vector_norm * analyzed2.vector_norm))
+
 def detect_key_phrase_matches(text1, text2):
     """
     Detect matches of important phrases between texts
     """
-    # Extract sentences
-    doc1 = nlp(text1)
-    doc2 = nlp(text2)
-    
-    sentences1 = [sent.text.lower() for sent in doc1.sents]
-    sentences2 = [sent.text.lower() for sent in doc2.sents]
-    
-    # Extract noun phrases
-    phrases1 = [chunk.text.lower() for chunk in doc1.noun_chunks if len(chunk.text) > 5]
-    phrases2 = [chunk.text.lower() for chunk in doc2.noun_chunks if len(chunk.text) > 5]
+    # Extract sentences and noun phrases
+    sentences1, phrases1 = _phrase_parts(text1 if isinstance(text1, AnalyzedText) else get_nlp()(text1))
+    sentences2, phrases2 = _phrase_parts(text2 if isinstance(text2, AnalyzedText) else get_nlp()(text2))
     
     # Calculate phrase match ratio
-    matched_phrases = 0
-    for phrase1 in phrases1:
-        for phrase2 in phrases2:
-            if SequenceMatcher(None, phrase1, phrase2).ratio() > 0.8:
-                matched_phrases += 1
-                break
+    matched_phrases = sum(1 for _ in _similar_pairs(phrases1, phrases2, 0.8, first_only=True))
     
     # Calculate sentence similarity
-    sentence_similarities = []
-    for sent1 in sentences1:
-        for sent2 in sentences2:
-            similarity = SequenceMatcher(None, sent1, sent2).ratio()
-            if similarity > 0.6:  # Only consider reasonably similar sentences
-                sentence_similarities.append(similarity)
+    # Only consider reasonably similar sentences
+    sentence_similarities = [similarity for _, similarity in _similar_pairs(sentences1, sentences2, 0.6)]
     
     # Calculate average sentence similarity
     avg_sentence_sim = sum(sentence_similarities) / len(sentence_similarities) if sentence_similarities else 0
@@ -198,10 +833,109 @@ def detect_key_phrase_matches(text1, text2):
     
     return (avg_sentence_sim + phrase_match_ratio) / 2
 
+def _bit_mask(positions, size):
+    """
+    Integer with the given bit positions set
+    """
+    bits = np.zeros(size, dtype=bool)
+    bits[positions] = True
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+class SubsequenceIndex:
+    """
+    Bit-parallel index that computes the longest common subsequence of a query with
+    every indexed string at once. SequenceMatcher only counts characters of a common
+    subsequence, so it bounds their ratio from above without dropping any match
+    A query costs a few operations on an integer of all indexed characters per query
+    character, i.e. O(len(query) * total length / 64): cheaper than aligning each pair,
+    but all queries together still grow quadratically with the length of the answers
+    """
+    def __init__(self, strings):
+        self.lengths = np.array([len(string) for string in strings], dtype=np.int64)
+        # Each string is followed by a guard bit that stops carries from leaking into the next one
+        self.starts = np.concatenate(([0], np.cumsum(self.lengths + 1)[:-1])).astype(np.int64)
+        self.size = int(self.lengths.sum()) + len(strings)
+        
+        positions = defaultdict(list)
+        for start, string in zip(self.starts.tolist(), strings):
+            for offset, char in enumerate(string):
+                positions[char].append(start + offset)
+        self.masks = {char: _bit_mask(pos, self.size) for char, pos in positions.items()}
+        self.full = _bit_mask([pos for pos_list in positions.values() for pos in pos_list], self.size)
+
+    def lcs_lengths(self, query):
+        """
+        Length of the longest common subsequence of the query with each indexed string
+        """
+        if not len(self.lengths):
+            return self.lengths
+        
+        # Allison-Dix: the zero bits of unmatched are the matched positions of each string
+        unmatched = self.full
+        for char in query:
+            mask = self.masks.get(char)
+            if mask is None:
+                continue
+            matched = unmatched & mask
+            unmatched = ((unmatched + matched) | (unmatched - matched)) & self.full
+        
+        bits = np.unpackbits(np.frombuffer(unmatched.to_bytes(self.size // 8 + 1, "little"), dtype=np.uint8),
+                             bitorder="little")[:self.size]
+        return self.lengths - np.add.reduceat(bits.astype(np.int64), self.starts)
+
+    def candidates(self, query, threshold):
+        """
+        Indices of the strings whose SequenceMatcher ratio with the query can exceed threshold
+        """
+        lengths = len(query) + self.lengths
+        bounds = np.where(lengths > 0, 2.0 * self.lcs_lengths(query) / np.maximum(lengths, 1), 1.0)
+        return np.flatnonzero(bounds > threshold).tolist()
+
+def _similar_pairs(strings1, strings2, threshold, first_only=False):
+    """
+    Yield (index in strings1, ratio) for string pairs whose SequenceMatcher ratio exceeds threshold
+    Long inputs only score the pairs a SubsequenceIndex cannot rule out; the cheap upper
+    bounds (real_quick_ratio, quick_ratio) skip pairs that cannot pass, so the result
+    is the same as aligning every pair. The bound itself is quadratic (see SubsequenceIndex)
+    With first_only, stop at the first match for each string in strings1
+    """
+    index = SubsequenceIndex(strings2) if len(strings1) * len(strings2) > INDEXED_MATCH_MIN_PAIRS else None
+    
+    for i, string1 in enumerate(strings1):
+        candidates = index.candidates(string1, threshold) if index is not None else range(len(strings2))
+        for j in candidates:
+            matcher = SequenceMatcher(None, string1, strings2[j])
+            if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+                continue
+            ratio = matcher.ratio()
+            if ratio > threshold:
+                yield i, ratio
+                if first_only:
+                    break
+
+def _phrase_parts(doc):
+    """
+    Return the lowercased sentences and noun phrases compared by key phrase matching
+    """
+    if isinstance(doc, AnalyzedText):
+        return doc.sentences, doc.noun_phrases
+    
+    sentences = [sent.text.lower() for sent in doc.sents]
+    phrases = [chunk.text.lower() for chunk in doc.noun_chunks if len(chunk.text) > 5]
+    return sentences, phrases
+
 def detect_document_structure(text):
     """
     Detect document structure features to compare document types
     """
+    if isinstance(text, AnalyzedText):
+        return text.structure
+    return _structure_features(text, get_nlp()(text))
+
+def _structure_features(text, doc):
+    """
+    Compute document structure features from a text and its parse
+    """
     features = {
         "bullet_points": len(re.findall(r'●|○|\*|\d+\.\s', text)),
         "has_sections": bool(re.search(r'\n\s*[A-Z][^.]*:', text)),
@@ -210,7 +944,6 @@ def detect_document_structure(text):
     }
     
     # Calculate average sentence length
-    doc = nlp(text)
     sentences = list(doc.sents)
     if sentences:
         features["avg_sentence_length"] = sum(len(sent) for sent in sentences) / len(sentences)
@@ -243,120 +976,393 @@ def structural_similarity(text1, text2):
     # Weight structural similarities
     return (bullet_similarity * 0.3 + section_similarity * 0.3 + sent_len_sim * 0.2 + para_len_sim * 0.2)
 
-def calculate_similarity(text1, text2):
+def sequence_similarity(text1, text2, char_limit=SEQUENCE_CHAR_LIMIT):
+    """
+    SequenceMatcher ratio of two texts with bounded cost
+    Texts up to char_limit characters get the exact character-level ratio. Longer texts
+    are cut into pairs of aligned segments of about char_limit characters, at token n-grams
+    the texts share (so the cuts follow insertions and moved blocks), and the matched
+    characters of every segment pair give the ratio. Each segment is scored like a text
+    at the limit, so the score stays on the character ratio's scale past it
+    """
+    if text1 == text2:
+        return 1.0
+    if len(text1) <= char_limit and len(text2) <= char_limit:
+        return SequenceMatcher(None, text1, text2).ratio()
+    
+    matcher = SequenceMatcher()
+    matched = 0
+    cuts = _sequence_cuts(text1, text2, char_limit)
+    for (start1, start2), (end1, end2) in zip(cuts, cuts[1:]):
+        matcher.set_seqs(text1[start1:end1], text2[start2:end2])
+        matched += sum(block.size for block in matcher.get_matching_blocks())
+    return 2.0 * matched / (len(text1) + len(text2))
+
+def _sequence_cuts(text1, text2, char_limit):
+    """
+    Character offsets (in text1, in text2) that cut two texts into aligned segment pairs of
+    about char_limit characters, from (0, 0) to the ends of both texts. Each cut is the
+    shared anchor nearest to an even split; with no anchor nearby the texts are cut in proportion
+    """
+    spans1 = [match.start() for match in re.finditer(r"\S+", text1)]
+    spans2 = [match.start() for match in re.finditer(r"\S+", text2)]
+    tokens1, tokens2 = text1.split(), text2.split()
+    anchors = [(spans1[position1], spans2[position2])
+               for position1, position2 in _unique_anchors(tokens1, 0, len(tokens1), tokens2, 0, len(tokens2))]
+    sums = [offset1 + offset2 for offset1, offset2 in anchors]
+    
+    total = len(text1) + len(text2)
+    segments = -(-max(len(text1), len(text2)) // char_limit)
+    cuts = [(0, 0)]
+    for i in range(1, segments):
+        target = total * i // segments
+        k = bisect_left(sums, target)
+        nearby = [anchors[j] for j in (k - 1, k) if 0 <= j < len(anchors) and abs(sums[j] - target) <= char_limit // 2]
+        if nearby:
+            cut = min(nearby, key=lambda anchor: abs(sum(anchor) - target))
+        else:
+            cut = (len(text1) * i // segments, len(text2) * i // segments)
+        if cut[0] > cuts[-1][0] and cut[1] > cuts[-1][1]:
+            cuts.append(cut)
+    cuts.append((len(text1), len(text2)))
+    return cuts
+
+def _unique_anchors(tokens1, lo1, hi1, tokens2, lo2, hi2, size=SEQUENCE_ANCHOR_SIZE):
+    """
+    Longest chain of token n-grams that occur exactly once in both stretches, in the
+    same order and without overlapping
+    :return: List of (position1, position2) n-gram starts, increasing on both sides
+    """
+    grams1 = [tuple(tokens1[i:i + size]) for i in range(lo1, hi1 - size + 1)]
+    grams2 = [tuple(tokens2[i:i + size]) for i in range(lo2, hi2 - size + 1)]
+    counts1, counts2 = Counter(grams1), Counter(grams2)
+    positions2 = {gram: position for position, gram in enumerate(grams2, lo2)
+                  if counts2[gram] == 1 and counts1[gram] == 1}
+    pairs = [(position, positions2[gram]) for position, gram in enumerate(grams1, lo1) if gram in positions2]
+    
+    # Longest increasing run of second positions, by patience sorting
+    tails, tail_indices, previous = [], [], [None] * len(pairs)
+    for i, (_, position2) in enumerate(pairs):
+        k = bisect_left(tails, position2)
+        if k:
+            previous[i] = tail_indices[k - 1]
+        if k == len(tails):
+            tails.append(position2)
+            tail_indices.append(i)
+        else:
+            tails[k] = position2
+            tail_indices[k] = i
+    chain = []
+    i = tail_indices[-1] if tail_indices else None
+    while i is not None:
+        chain.append(pairs[i])
+        i = previous[i]
+    
+    # Overlapping n-grams of one matching run become a single anchor
+    anchors = []
+    for position1, position2 in reversed(chain):
+        if not anchors or (position1 >= anchors[-1][0] + size and position2 >= anchors[-1][1] + size):
+            anchors.append((position1, position2))
+    return anchors
+
+# Cascade stages in order of cost; the later stages only run while they can still
+# change the similarity category
+SIMILARITY_STAGES = [
+    ("content", "semantic", "tfidf", "structure"),
+    ("phrase",),
+    ("sequence",)
+]
+
+def calculate_similarity(text1, text2, precomputed=None, strict=True, trace=None):
     """
     Improved similarity calculation with enhanced semantic understanding
+    Accepts raw strings or AnalyzedText objects, so each text is parsed at most once
+    :param precomputed: Optional dict of component similarities already computed for the
+        whole cohort ("content", "semantic", "tfidf", "phrase", "structure", "sequence")
+    :param strict: Compute every component; otherwise stop as soon as the components not
+        yet computed can no longer change the similarity category, and return the middle
+        of the remaining score range
+    :param trace: Optional dict that receives the components computed ("stages"), their
+        values ("components") and the lowest and highest score still possible ("score_bounds")
     """
+    components = dict(precomputed or {})
+    
+    # Analyze texts once and share the features between all methods
+    analyzed1 = text1 if isinstance(text1, AnalyzedText) else analyze_text(text1)
+    analyzed2 = text2 if isinstance(text2, AnalyzedText) else analyze_text(text2)
+    
     # Initial validation - check if texts are significantly different in length
-    len_ratio = min(len(text1), len(text2)) / max(len(text1), len(text2)) if max(len(text1), len(text2)) > 0 else 0
+    len1, len2 = len(analyzed1.text), len(analyzed2.text)
+    len_ratio = min(len1, len2) / max(len1, len2) if max(len1, len2) > 0 else 0
     if len_ratio < 0.2:  # If one text is less than 20% the length of the other
         logger.info("Texts have very different lengths, likely not similar")
         
-    # Preprocess texts
-    processed1 = preprocess_text(text1)
-    processed2 = preprocess_text(text2)
+    # Preprocessed texts
+    processed1 = analyzed1.processed
+    processed2 = analyzed2.processed
     
     # Logging for debugging
-    logger.info(f"Processed Text 1: {processed1[:100]}...")
-    logger.info(f"Processed Text 2: {processed2[:100]}...")
+    logger.debug(f"Processed Text 1: {processed1[:100]}...")
+    logger.debug(f"Processed Text 2: {processed2[:100]}...")
     
     # Check if texts are too short after processing
     if len(processed1) < 10 or len(processed2) < 10:
         logger.warning("Texts too short after processing")
         return 0
     
-    try:
+    methods = {
         # Method 1: Content-based overlap
-        content_sim = calculate_content_overlap(text1, text2)
-        logger.info(f"Content-based Similarity: {content_sim:.2f}")
-        
+        "content": lambda: calculate_content_overlap(analyzed1, analyzed2),
         # Method 2: Semantic similarity with spaCy
-        semantic_sim = calculate_embedding_similarity(processed1, processed2)
-        logger.info(f"Semantic Similarity: {semantic_sim:.2f}")
-        
+        "semantic": lambda: calculate_embedding_similarity(analyzed1, analyzed2),
         # Method 3: TF-IDF based similarity
-        tfidf_sim = calculate_tfidf_similarity(processed1, processed2)
-        logger.info(f"TF-IDF Similarity: {tfidf_sim:.2f}")
-        
+        "tfidf": lambda: calculate_tfidf_similarity(analyzed1, analyzed2),
         # Method 4: Key phrase matching
-        phrase_sim = detect_key_phrase_matches(text1, text2)
-        logger.info(f"Key Phrase Similarity: {phrase_sim:.2f}")
-        
+        "phrase": lambda: detect_key_phrase_matches(analyzed1, analyzed2),
         # Method 5: Structural similarity
-        struct_sim = structural_similarity(text1, text2)
-        logger.info(f"Structural Similarity: {struct_sim:.2f}")
-        
+        "structure": lambda: structural_similarity(analyzed1, analyzed2),
         # Method 6: Sequential similarity as final check
-        seq_sim = SequenceMatcher(None, processed1, processed2).ratio()
-        logger.info(f"Sequence Similarity: {seq_sim:.2f}")
+        "sequence": lambda: sequence_similarity(processed1, processed2)
+    }
+    
+    try:
+        stages = []
+        for stage in SIMILARITY_STAGES:
+            for name in stage:
+                if name not in components:
+                    with profile_stage(name):
+                        components[name] = methods[name]()
+                logger.info(f"{name.capitalize()} Similarity: {components[name]:.2f}")
+            stages.extend(stage)
+            
+            # Every component lies in 0-1 and the combination is monotone in each of
+            # them, so the missing ones at 0 and at 1 bound the final score
+            low = combine_similarity({name: components.get(name, 0.0) for name in methods})
+            high = combine_similarity({name: components.get(name, 1.0) for name in methods})
+            if not strict and similarity_category(low) == similarity_category(high):
+                break
         
-        # Calculate semantic boost factor
-        # If semantic similarity is high but content overlap is lower, boost the score
-        semantic_boost = 1.0
-        if semantic_sim > 0.7 and content_sim < 0.5:
-            semantic_boost = 1.3  # 30% boost for semantically similar content
+        if components["semantic"] > 0.7 and components["content"] < 0.5:
             logger.info("Applied semantic similarity boost")
-        
-        # High penalty for very low content and semantic overlap
-        if content_sim < 0.05 and semantic_sim < 0.2:
+        if components["content"] < 0.05 and components["semantic"] < 0.2:
             logger.info("Very low content and semantic overlap detected")
-            penalty_factor = 0.3
-        else:
-            penalty_factor = 1.0
         
-        # Weighted combination with semantic similarity having higher weight
-        final_sim = penalty_factor * semantic_boost * (
-            content_sim * 0.25 +       # Content overlap
-            semantic_sim * 0.30 +      # Semantic similarity (increased weight)
-            tfidf_sim * 0.20 +         # TF-IDF similarity
-            phrase_sim * 0.15 +        # Key phrase matching
-            struct_sim * 0.05 +        # Document structure
-            seq_sim * 0.05             # Sequence matching
-        ) * 100
+        final_sim = (low + high) / 2
         
-        # Apply progressive scoring curve to reward higher similarity
-        # This gives higher scores to answers that are more semantically similar
-        if final_sim > 60:
-            final_sim = 60 + (final_sim - 60) * 1.2  # Boost scores above 60%
-        
-        # Threshold for minimum similarity
-        if content_sim < 0.02 and semantic_sim < 0.2:
-            logger.info("Content and semantic similarity both very low")
-            final_sim = min(final_sim, 10)  # Cap at max 10% for very different docs
+        if trace is not None:
+            trace["stages"] = stages
+            trace["score_bounds"] = (low, high)
+            trace["components"] = {name: float(components[name]) for name in stages}
+        if len(stages) < len(methods):
+            logger.info(f"Skipped {', '.join(name for name in methods if name not in stages)}: "
+                        f"score is {low:.2f}-{high:.2f} either way")
         
     except Exception as e:
         logger.error(f"Error in similarity calculation: {e}")
         return 0
     
+    return final_sim
+
+def combine_similarity(components, config=None):
+    """
+    Blend the six component similarities into the final 0-100 score
+    :param config: Optional scoring config overriding SCORING_CONFIG (weights, boost, penalty,
+        curve and cap); rescore_components applies the same blend to a whole cohort
+    """
+    config = _scoring_config(config)
+    weights = config["weights"]
+    content_sim = components["content"]
+    semantic_sim = components["semantic"]
+    
+    # Calculate semantic boost factor
+    # If semantic similarity is high but content overlap is lower, boost the score
+    semantic_boost = 1.0
+    if semantic_sim > config["boost_min_semantic"] and content_sim < config["boost_max_content"]:
+        semantic_boost = config["semantic_boost"]  # Boost for semantically similar content
+    
+    # High penalty for very low content and semantic overlap
+    if content_sim < config["penalty_max_content"] and semantic_sim < config["penalty_max_semantic"]:
+        penalty_factor = config["penalty"]
+    else:
+        penalty_factor = 1.0
+    
+    # Weighted combination with semantic similarity having higher weight
+    weighted = 0.0
+    for name in COMPONENTS:
+        weighted += components[name] * weights[name]
+    final_sim = penalty_factor * semantic_boost * weighted * 100
+    
+    # Apply progressive scoring curve to reward higher similarity
+    # This gives higher scores to answers that are more semantically similar
+    if final_sim > config["curve_start"]:
+        final_sim = config["curve_start"] + (final_sim - config["curve_start"]) * config["curve_factor"]
+    
+    # Threshold for minimum similarity
+    if content_sim < config["cap_max_content"] and semantic_sim < config["cap_max_semantic"]:
+        final_sim = min(final_sim, config["cap"])  # Cap very different docs
+    
     # Constrain to 0-100 range
     return max(0, min(100, final_sim))
 
-def evaluate_answers(answer_file_path, answer_key_file_path):
+def _scoring_config(config):
     """
-    Enhanced answer evaluation with improved encoding detection and validation
+    SCORING_CONFIG with the entries of config (and of its "weights") overridden
+    """
+    if not config:
+        return SCORING_CONFIG
+    merged = dict(SCORING_CONFIG, **config)
+    merged["weights"] = dict(SCORING_CONFIG["weights"], **config.get("weights", {}))
+    return merged
+
+def component_scores(results):
+    """
+    Collect the component similarities of evaluated answers into one columnar array
+    :param results: Results of evaluate_batch (dict or list) or _score_answer
+    :return: Float array of shape (answers, len(COMPONENTS)); components that were not
+        computed (errors, or skipped in non-strict mode) are NaN
+    """
+    if isinstance(results, dict):
+        results = list(results.values())
+    matrix = np.full((len(results), len(COMPONENTS)), np.nan)
+    for i, result in enumerate(results):
+        components = result.get("components") or {}
+        for j, name in enumerate(COMPONENTS):
+            if name in components:
+                matrix[i, j] = components[name]
+    return matrix
+
+def save_component_scores(path, results, names=None):
+    """
+    Save the component similarities of a cohort so it can be rescored without recomputation
+    Each component is stored as its own column in a compressed .npz file
+    :param names: Student names in row order (taken from the keys when results is a dict)
+    """
+    if names is None and isinstance(results, dict):
+        names = list(results.keys())
+    matrix = component_scores(results)
+    names = np.array([str(name) for name in names] if names is not None else [], dtype=str)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, names=names, scoring_version=np.array(SCORING_VERSION),
+                            **{name: matrix[:, j] for j, name in enumerate(COMPONENTS)})
+
+def load_component_scores(path):
+    """
+    Load component similarities saved with save_component_scores
+    :return: The student names (possibly empty) and the (answers, components) array
+    """
+    with np.load(path) as data:
+        # Files saved before the version was stored hold version 1 scores
+        version = int(data["scoring_version"]) if "scoring_version" in data.files else 1
+        if version != SCORING_VERSION:
+            raise ValueError(f"Component scores in {path} are scoring version {version}, not {SCORING_VERSION}")
+        names = [str(name) for name in data["names"]]
+        matrix = np.column_stack([data[name] for name in COMPONENTS])
+    return names, matrix
+
+def rescore_components(matrix, config=None):
+    """
+    Apply a scoring config to the stored component similarities of a whole cohort at once,
+    equal to combine_similarity for each row
+    Rows with some components missing get the middle of their remaining score range, as in
+    calculate_similarity; rows with none (failed evaluations) score 0
+    :param matrix: Array of shape (answers, len(COMPONENTS)) from component_scores
+    :return: NumPy array with one 0-100 score per answer
+    """
+    matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(COMPONENTS))
+    missing = np.isnan(matrix)
+    low = _combine_columns(np.where(missing, 0.0, matrix), config)
+    high = _combine_columns(np.where(missing, 1.0, matrix), config)
+    scores = np.where(missing.any(axis=1), (low + high) / 2, low)
+    return np.where(missing.all(axis=1), 0.0, scores)
+
+def _combine_columns(matrix, config):
+    """
+    Vectorized combine_similarity over the rows of a complete component array
     """
-    # Possible encodings to try
-    encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
+    config = _scoring_config(config)
+    weights = config["weights"]
+    columns = {name: matrix[:, j] for j, name in enumerate(COMPONENTS)}
+    content_sim = columns["content"]
+    semantic_sim = columns["semantic"]
     
-    student_answer = None
-    answer_key = None
+    semantic_boost = np.where(
+        (semantic_sim > config["boost_min_semantic"]) & (content_sim < config["boost_max_content"]),
+        config["semantic_boost"], 1.0
+    )
+    penalty_factor = np.where(
+        (content_sim < config["penalty_max_content"]) & (semantic_sim < config["penalty_max_semantic"]),
+        config["penalty"], 1.0
+    )
     
-    # Try to read files with different encodings
-    for encoding in encodings:
-        try:
-            if not student_answer:
-                with open(answer_file_path, 'r', encoding=encoding) as f:
-                    student_answer = f.read().strip()
-            
-            if not answer_key:
-                with open(answer_key_file_path, 'r', encoding=encoding) as f:
-                    answer_key = f.read().strip()
-            
-            if student_answer and answer_key:
-                break
-                
-        except Exception as e:
-            logger.warning(f"Failed with {encoding} encoding: {e}")
+    # Summed column by column in the same order as combine_similarity
+    weighted = np.zeros(len(matrix))
+    for name in COMPONENTS:
+        weighted += columns[name] * weights[name]
+    final_sim = penalty_factor * semantic_boost * weighted * 100
+    
+    final_sim = np.where(
+        final_sim > config["curve_start"],
+        config["curve_start"] + (final_sim - config["curve_start"]) * config["curve_factor"],
+        final_sim
+    )
+    final_sim = np.where(
+        (content_sim < config["cap_max_content"]) & (semantic_sim < config["cap_max_semantic"]),
+        np.minimum(final_sim, config["cap"]), final_sim
+    )
+    return np.clip(final_sim, 0, 100)
+
+def similarity_category(similarity):
+    """
+    Category of a 0-100 similarity score
+    """
+    if similarity < 15:
+        return "very_low"
+    if similarity < 30:
+        return "low"
+    if similarity < 60:
+        return "moderate"
+    if similarity < 85:
+        return "high"
+    return "very_high"
+
+def decode_text(data):
+    """
+    Decode uploaded bytes into text in a single pass: a byte order mark selects the
+    encoding, otherwise UTF-8 with a Latin-1 fallback (which accepts any byte string)
+    Newlines are normalized like a text-mode file read; str input passes through
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+        if data.startswith(codecs.BOM_UTF8):
+            data = data[len(codecs.BOM_UTF8):].decode("utf-8", errors="replace")
+        elif data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            data = data.decode("utf-16", errors="replace")
+        else:
+            try:
+                data = data.decode("utf-8")
+            except UnicodeDecodeError:
+                data = data.decode("latin-1")
+    elif data is None:
+        return ""
+    else:
+        data = str(data)
+    return data.replace("\r\n", "\n").replace("\r", "\n")
+
+def evaluate_answers(answer_file_path, answer_key_file_path, strict=True, by_question=False, preprocess=None):
+    """
+    Enhanced answer evaluation with improved encoding detection and validation
+    :param by_question: Score each numbered question separately (see evaluate_by_question)
+    :param preprocess: Preprocessing mode, "spacy" or "lite" (defaults to PREPROCESS_MODE)
+    """
+    # Read each file once and detect its encoding from the bytes
+    try:
+        with open(answer_file_path, 'rb') as f:
+            student_answer = decode_text(f.read()).strip()
+        with open(answer_key_file_path, 'rb') as f:
+            answer_key = decode_text(f.read()).strip()
+    except OSError as e:
+        logger.warning(f"Failed to read answer files: {e}")
+        student_answer = answer_key = None
     
     # Validate successful file reading
     if not student_answer or not answer_key:
@@ -365,36 +1371,315 @@ def evaluate_answers(answer_file_path, answer_key_file_path):
             "message": "Could not read files with any known encoding"
         }
     
+    if by_question:
+        return evaluate_by_question(student_answer, answer_key, strict=strict, preprocess=preprocess)
+    return evaluate_text(student_answer, answer_key, strict, preprocess)
+
+def evaluate_text(student_answer, answer_key, strict=True, preprocess=None):
+    """
+    Evaluate one student answer against an answer key held in memory
+    :param student_answer: Answer text, or the raw bytes of an uploaded file
+    :param answer_key: Answer key text, or the raw bytes of an uploaded file
+    :param preprocess: Preprocessing mode, "spacy" or "lite" (defaults to PREPROCESS_MODE)
+    """
+    student_answer = decode_text(student_answer).strip()
+    answer_key = decode_text(answer_key).strip()
+    
     # Basic content validation
     if len(student_answer) < 10 or len(answer_key) < 10:
-        return {
-            "status": "error", 
-            "message": "One or both files contain insufficient content",
-            "overall_score": 0
-        }
+        return _insufficient_content_result()
+    
+    # Analyze each text once and calculate similarity
+    return _score_answer(analyze_text(student_answer, preprocess), analyze_text(answer_key, preprocess), strict=strict)
+
+def segment_questions(text, numbers=None):
+    """
+    Split an answer script into its numbered questions
+    Question numbers must increase but may skip (an unanswered question). Other numbered
+    lines are taken as lists inside an answer, which count up from 1; the headings are
+    chosen so that as many lines as possible are questions while the rest read as such
+    lists. Text before the first heading is ignored
+    :param numbers: Question numbers (as strings) that can start a question, e.g. those of
+        the answer key when splitting a student's script
+    :return: Dict of question number (as a string) to its text, empty if unnumbered
+    """
+    text = decode_text(text)
+    matches = list(QUESTION_HEADING.finditer(text))
+    values = [int(match.group(1)) for match in matches]
+    allowed = [numbers is None or str(value) in numbers for value in values]
+    
+    # best[i]: score of the best split whose last question starts at heading i; every
+    # question scores one and every numbered line that does not continue a list costs one
+    best = [None] * len(matches)
+    back = [None] * len(matches)
+    end_score, last_question = None, None
+    for i in range(len(matches)):
+        if allowed[i] and (best[i] is None or best[i] < 1):
+            best[i], back[i] = 1, None
+        if best[i] is None:
+            continue
+        strays, previous = 0, None
+        for j in range(i + 1, len(matches) + 1):
+            if j == len(matches):
+                if end_score is None or best[i] - strays > end_score:
+                    end_score, last_question = best[i] - strays, i
+                break
+            if allowed[j] and values[j] > values[i]:
+                score = best[i] + 1 - strays
+                if best[j] is None or score > best[j]:
+                    best[j], back[j] = score, i
+            # Heading j as a list item inside question i
+            if not (values[j] == 1 or (previous is not None and values[j] == previous + 1)):
+                strays += 1
+            previous = values[j]
+    
+    headings = []
+    while last_question is not None:
+        headings.append(last_question)
+        last_question = back[last_question]
+    headings.reverse()
+    
+    segments = {}
+    for k, i in enumerate(headings):
+        end = matches[headings[k + 1]].start() if k + 1 < len(headings) else len(text)
+        segments[str(values[i])] = text[matches[i].end():end].strip()
+    return segments
+
+def _segment_hash(student_segment, key_segment, strict, preprocess=None):
+    """
+    Identify a question pair with the features, scoring version and mode it is scored with
+    """
+    digest = hashlib.sha256()
+    for part in (feature_version(preprocess), str(SCORING_VERSION), str(strict), key_segment, student_segment):
+        digest.update(part.encode("utf-8", errors="surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _score_pair(pair):
+    """
+    Score one (student, key, strict) pair of analyzed texts in a worker process
+    """
+    student_analyzed, key_analyzed, strict = pair
+    return _score_answer(student_analyzed, key_analyzed, strict=strict)
+
+def evaluate_by_question(student_answer, answer_key, previous=None, workers=None, cache=None, strict=True,
+                         preprocess=None):
+    """
+    Evaluate an answer script question by question instead of as one text
+    Both scripts are split into numbered questions and each question pair is scored on
+    its own, so the quadratic phrase and sequence matching only sees short texts
+    :param student_answer: Answer script text, or the raw bytes of an uploaded file
+    :param answer_key: Answer key text, or the raw bytes of an uploaded file
+    :param previous: Earlier result of this function for the same student; questions whose
+        key and answer text are unchanged reuse their earlier result
+    :param workers: Number of worker processes scoring question pairs (defaults to SCORING_WORKERS)
+    :param cache: Optional FeatureCache so unchanged segments skip NLP parsing
+    :param strict: Compute every similarity component (see calculate_similarity)
+    :param preprocess: Preprocessing mode, "spacy" or "lite" (defaults to PREPROCESS_MODE)
+    :return: Result in the evaluate_answers format, plus per-question results under "questions"
+    """
+    student_answer = decode_text(student_answer).strip()
+    answer_key = decode_text(answer_key).strip()
+    key_segments = segment_questions(answer_key)
+    # The student's script is split on the key's question numbers only
+    student_segments = segment_questions(student_answer, numbers=key_segments)
     
-    # Calculate similarity
-    similarity = calculate_similarity(student_answer, answer_key)
+    # Unnumbered scripts are scored as a whole
+    if len(key_segments) < 2 or not student_segments:
+        result = evaluate_text(student_answer, answer_key, strict, preprocess)
+        result["questions"] = {}
+        return result
     
-    # Additional quality checks
-    similarity_categories = {
-        "very_low": similarity < 15,
-        "low": 15 <= similarity < 30,
-        "moderate": 30 <= similarity < 60,
-        "high": 60 <= similarity < 85,
-        "very_high": similarity >= 85
+    previous_questions = (previous or {}).get("questions", {})
+    questions = {}
+    pending = []
+    for number, key_segment in key_segments.items():
+        student_segment = student_segments.get(number, "")
+        segment_hash = _segment_hash(student_segment, key_segment, strict, preprocess)
+        earlier = previous_questions.get(number)
+        if earlier is not None and earlier.get("segment_hash") == segment_hash:
+            questions[number] = earlier
+        elif not student_segment:
+            questions[number] = {
+                "status": "error",
+                "message": "No answer found for this question",
+                "overall_score": 0,
+                "segment_hash": segment_hash
+            }
+        elif len(student_segment) < 10 or len(key_segment) < 10:
+            questions[number] = dict(_insufficient_content_result(), segment_hash=segment_hash)
+        else:
+            pending.append((number, student_segment, key_segment, segment_hash))
+    
+    if pending:
+        # Analyze every changed segment in one bulk pass, then score the pairs in parallel
+        analyzed = analyze_texts(
+            [student for _, student, _, _ in pending] + [key for _, _, key, _ in pending], cache=cache,
+            preprocess=preprocess
+        )
+        pairs = [(analyzed[i], analyzed[len(pending) + i], strict) for i in range(len(pending))]
+        workers = max(1, min(workers or SCORING_WORKERS, len(pairs)))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                scored = list(executor.map(_score_pair, pairs))
+        else:
+            scored = [_score_pair(pair) for pair in pairs]
+        for (number, _, _, segment_hash), result in zip(pending, scored):
+            questions[number] = dict(result, segment_hash=segment_hash)
+    
+    # Every question of the key counts equally
+    questions = {number: questions[number] for number in key_segments}
+    similarity = sum(result["overall_score"] for result in questions.values()) / len(questions)
+    answered = sum(1 for result in questions.values() if result["status"] == "success")
+    
+    return {
+        "status": "success",
+        "overall_score": similarity,
+        "similarity_category": similarity_category(similarity),
+        "questions": questions,
+        "rescored": [number for number, _, _, _ in pending],
+        "details": [
+            f"Similarity Score: {similarity:.2f}%",
+            f"Questions Scored: {answered} of {len(questions)}",
+            f"Questions Rescored: {len(pending)}"
+        ]
     }
+
+def evaluate_batch(answer_key, student_answers, n_process=None, batch_size=NLP_BATCH_SIZE,
+                   corpus_tfidf=True, tfidf_model_path=None, cache=None, embedding_backend=None, strict=True,
+                   profiler=None, preprocess=None):
+    """
+    Evaluate a whole cohort of student answers against one answer key
+    The key is analyzed once (concepts, TF-IDF terms, noun phrases, sentences,
+    embedding and structure) and every student is scored against that profile
+    :param answer_key: Answer key text or raw file bytes, or an AnalyzedText of it
+    :param student_answers: Dict of student name to answer text (or raw file bytes), or a
+        list of answer texts
+    :param n_process: Number of spaCy worker processes used to analyze the answers
+    :param batch_size: Number of answers per spaCy batch
+    :param corpus_tfidf: Fit TF-IDF once on the key plus the whole cohort instead of per pair
+    :param tfidf_model_path: Optional file to save the corpus TF-IDF model to, or reuse it from
+    :param cache: Optional FeatureCache so reruns on the same texts skip NLP parsing
+    :param embedding_backend: Name or instance of the embedding backend scoring semantic
+        similarity for the whole cohort (defaults to EMBEDDING_BACKEND)
+    :param strict: Compute every similarity component; otherwise skip the expensive ones
+        (phrase and sequence matching) once they cannot change an answer's category
+    :param profiler: Optional StageProfiler recording the time spent in each stage of this
+        batch (defaults to the active profiler, if any)
+    :param preprocess: Preprocessing mode, "spacy" or "lite" (defaults to PREPROCESS_MODE)
+    :return: Results in the evaluate_answers format, as a dict keyed like the input or a list
+    """
+    if not isinstance(student_answers, dict):
+        student_answers = list(student_answers)
+    profiler = profiler or active_profiler()
+    if profiler is None:
+        return _evaluate_batch(answer_key, student_answers, n_process, batch_size, corpus_tfidf,
+                               tfidf_model_path, cache, embedding_backend, strict, preprocess)
+    with profiler, profiler.batch(len(student_answers)):
+        return _evaluate_batch(answer_key, student_answers, n_process, batch_size, corpus_tfidf,
+                               tfidf_model_path, cache, embedding_backend, strict, preprocess)
+
+def _evaluate_batch(answer_key, student_answers, n_process, batch_size, corpus_tfidf,
+                    tfidf_model_path, cache, embedding_backend, strict, preprocess):
+    """
+    Evaluate a cohort of student answers against one answer key (see evaluate_batch)
+    """
+    if isinstance(student_answers, dict):
+        names = list(student_answers.keys())
+        texts = list(student_answers.values())
+    else:
+        names = None
+        texts = list(student_answers)
+    
+    if isinstance(answer_key, AnalyzedText):
+        key_analyzed = answer_key
+    else:
+        answer_key = decode_text(answer_key).strip()
+        key_analyzed = analyze_texts([answer_key], cache=cache, preprocess=preprocess)[0] \
+            if len(answer_key) >= 10 else None
+    
+    student_answers = [decode_text(text).strip() for text in texts]
+    
+    # Analyze all valid answers in one bulk pass
+    valid = [i for i, text in enumerate(student_answers) if key_analyzed is not None and len(text) >= 10]
+    analyzed = dict(zip(valid, analyze_texts(
+        [student_answers[i] for i in valid], n_process, batch_size, cache, preprocess
+    )))
+    precomputed = {i: {} for i in valid}
+    
+    # Content overlap for every student at once from a sparse concept matrix
+    if valid:
+        with profile_stage("content"):
+            similarities = content_overlap_similarities(key_analyzed, [analyzed[i] for i in valid])
+        for i, similarity in zip(valid, similarities):
+            precomputed[i]["content"] = float(similarity)
+    
+    # Semantic similarity for every student with one matrix product against the key
+    if valid:
+        try:
+            backend = embedding_backend if isinstance(embedding_backend, EmbeddingBackend) \
+                else get_embedding_backend(embedding_backend)
+            with profile_stage("semantic"):
+                similarities = backend.similarities(key_analyzed, [analyzed[i] for i in valid])
+            for i, similarity in zip(valid, similarities):
+                precomputed[i]["semantic"] = float(similarity)
+        except Exception as e:
+            logger.error(f"Error in bulk embedding similarity, falling back to pairwise: {e}")
+    
+    # Corpus-level TF-IDF similarities for every student at once
+    if corpus_tfidf and valid:
+        try:
+            with profile_stage("tfidf"):
+                similarities = corpus_tfidf_similarities(
+                    key_analyzed.processed, [analyzed[i].processed for i in valid], tfidf_model_path
+                )
+            for i, similarity in zip(valid, similarities):
+                precomputed[i]["tfidf"] = float(similarity)
+        except Exception as e:
+            logger.error(f"Error in corpus TF-IDF calculation, falling back to pairwise: {e}")
     
-    category = next(cat for cat, condition in similarity_categories.items() if condition)
+    results = []
+    for i, student_answer in enumerate(student_answers):
+        if not student_answer:
+            results.append({
+                "status": "error",
+                "message": "Student answer is empty"
+            })
+        elif i not in analyzed:
+            results.append(_insufficient_content_result())
+        else:
+            results.append(_score_answer(analyzed[i], key_analyzed, precomputed[i], strict))
+    
+    return dict(zip(names, results)) if names is not None else results
+
+def _insufficient_content_result():
+    """
+    Error result for answers or keys that are too short to evaluate
+    """
+    return {
+        "status": "error", 
+        "message": "One or both files contain insufficient content",
+        "overall_score": 0
+    }
+
+def _score_answer(student_analyzed, key_analyzed, precomputed=None, strict=True):
+    """
+    Score an analyzed student answer against an analyzed answer key
+    """
+    trace = {}
+    similarity = calculate_similarity(student_analyzed, key_analyzed, precomputed, strict, trace)
     
     return {
         "status": "success",
         "overall_score": similarity,
-        "similarity_category": category,
+        "similarity_category": similarity_category(similarity),
+        "stages": trace.get("stages", []),
+        "score_bounds": trace.get("score_bounds", (similarity, similarity)),
+        "components": trace.get("components", {}),
         "details": [
             f"Similarity Score: {similarity:.2f}%",
-            f"Content Words in Student Answer: {len(preprocess_text(student_answer).split())}",
-            f"Content Words in Answer Key: {len(preprocess_text(answer_key).split())}"
+            f"Content Words in Student Answer: {len(student_analyzed.processed.split())}",
+            f"Content Words in Answer Key: {len(key_analyzed.processed.split())}"
         ]
     }
 
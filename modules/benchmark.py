@@ -0,0 +1,329 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+# Default benchmark grid: answer lengths in words and cohort sizes in students
+DEFAULT_WORD_COUNTS = (100, 1000, 10000)
+DEFAULT_COHORT_SIZES = (10, 100, 2000)
+DEFAULT_SAMPLES = 5
+
+# Length of the answers in the cohort benchmarks
+COHORT_ANSWER_WORDS = 200
+
+# Docx answer sets used as the realistic fixture and as the source of synthetic text
+FIXTURE_DIRS = (os.path.join("test_files", "1"), os.path.join("test_files", "2"))
+
+# Relative slowdown (or memory growth) reported as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Baseline file format version
+BASELINE_FORMAT = 1
+
+def load_fixtures(directories=FIXTURE_DIRS):
+    """
+    Reads the docx answer sets: one (name, key text, {file name: answer text}) per directory
+    that holds an ak.docx key
+    """
+    from modules.text_extraction import extract_text_from_docx
+
+    fixtures = []
+    for directory in directories:
+        key_path = os.path.join(directory, "ak.docx")
+        if not os.path.exists(key_path):
+            continue
+        answers = {
+            os.path.basename(path): extract_text_from_docx(path)
+            for path in sorted(glob.glob(os.path.join(directory, "*.docx")))
+            if path != key_path
+        }
+        fixtures.append((os.path.basename(directory), extract_text_from_docx(key_path), answers))
+    return fixtures
+
+def fixture_sentences(fixtures):
+    """
+    Every non-empty line of the fixture texts, the building blocks of synthetic answers
+    """
+    sentences = []
+    for _, key, answers in fixtures:
+        for text in [key] + list(answers.values()):
+            sentences.extend(line.strip() for line in text.splitlines() if len(line.split()) >= 3)
+    if not sentences:
+        raise ValueError("No fixture text found; run from the repository root or pass --fixtures")
+    return sentences
+
+def synthetic_text(sentences, words, rng):
+    """
+    Builds a text of about words words from randomly drawn fixture sentences, in paragraphs
+    """
+    parts = []
+    count = 0
+    while count < words:
+        sentence = rng.choice(sentences)
+        parts.append(sentence)
+        count += len(sentence.split())
+        if rng.random() < 0.2:
+            parts.append("\n\n")
+    return " ".join(parts).replace(" \n\n ", "\n\n").strip()
+
+def synthetic_answer(key, sentences, rng, edit_rate=None):
+    """
+    Derives a student answer from a key by dropping, replacing and reordering words,
+    so answers span the whole range of similarity categories
+    """
+    edit_rate = rng.uniform(0.05, 0.9) if edit_rate is None else edit_rate
+    filler = rng.choice(sentences).split()
+    words = []
+    for word in key.split(" "):
+        roll = rng.random()
+        if roll < edit_rate / 3:
+            continue
+        if roll < 2 * edit_rate / 3:
+            word = rng.choice(filler)
+        words.append(word)
+    # Swap some neighbouring words
+    for _ in range(int(len(words) * edit_rate / 4)):
+        i = rng.randrange(max(1, len(words) - 1))
+        words[i:i + 2] = words[i:i + 2][::-1]
+    return " ".join(words)
+
+def _stats(latencies, total_s, peak_bytes=None):
+    """
+    Throughput, latency percentiles and peak memory of one benchmark
+    """
+    latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "n": len(latencies),
+        "total_s": total_s,
+        "throughput_per_s": len(latencies) / total_s if total_s > 0 else None,
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        "p90_ms": float(np.percentile(latencies_ms, 90)) if len(latencies) else None,
+        "p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+        "max_ms": float(latencies_ms.max()) if len(latencies) else None,
+        "peak_bytes": peak_bytes
+    }
+
+def _time_each(fn, items):
+    """
+    Calls fn on every item, returning the latency of each call and the total time
+    """
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        call_start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - call_start)
+    return latencies, time.perf_counter() - start
+
+def _peak_memory(fn, *args):
+    """
+    Peak traced Python memory of one call, in bytes
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+def bench_evaluate_answers(key_answer_pairs, track_memory=True):
+    """
+    Latency of evaluate_answers on (key, answer) text pairs, read from files like the app does
+    """
+    from modules.ans_eval import evaluate_answers
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, (key, answer) in enumerate(key_answer_pairs):
+            key_path = os.path.join(directory, f"key_{i}.txt")
+            answer_path = os.path.join(directory, f"answer_{i}.txt")
+            for path, text in ((key_path, key), (answer_path, answer)):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+            paths.append((answer_path, key_path))
+
+        latencies, total = _time_each(lambda pair: evaluate_answers(*pair), paths)
+        peak = _peak_memory(evaluate_answers, *paths[0]) if track_memory and paths else None
+    return _stats(latencies, total, peak)
+
+def bench_methods(key_answer_pairs, track_memory=True):
+    """
+    Latency of each similarity method on pre-analyzed (key, answer) pairs
+    """
+    from modules import ans_eval
+
+    methods = {
+        "content": ans_eval.calculate_content_overlap,
+        "semantic": ans_eval.calculate_embedding_similarity,
+        "tfidf": ans_eval.calculate_tfidf_similarity,
+        "phrase": ans_eval.detect_key_phrase_matches,
+        "structure": ans_eval.structural_similarity,
+        "sequence": lambda answer, key: ans_eval.sequence_similarity(answer.processed, key.processed)
+    }
+    keys = ans_eval.analyze_texts([key for key, _ in key_answer_pairs])
+    answers = ans_eval.analyze_texts([answer for _, answer in key_answer_pairs])
+    pairs = list(zip(answers, keys))
+
+    results = {}
+    for name, method in methods.items():
+        latencies, total = _time_each(lambda pair: method(*pair), pairs)
+        peak = _peak_memory(method, *pairs[0]) if track_memory and pairs else None
+        results[name] = _stats(latencies, total, peak)
+    return results
+
+def bench_cohort(key, answers, track_memory=True):
+    """
+    Throughput of evaluate_batch grading a whole cohort against one key
+    """
+    from modules.ans_eval import evaluate_batch
+
+    start = time.perf_counter()
+    evaluate_batch(key, answers)
+    total = time.perf_counter() - start
+    peak = _peak_memory(evaluate_batch, key, answers) if track_memory else None
+    # Per-answer latency is the batch time spread over the cohort
+    return _stats([total / len(answers)] * len(answers), total, peak)
+
+def run_benchmarks(word_counts=DEFAULT_WORD_COUNTS, cohort_sizes=DEFAULT_COHORT_SIZES, samples=DEFAULT_SAMPLES,
+                   seed=0, track_memory=True, fixture_dirs=FIXTURE_DIRS, log=print):
+    """
+    Runs the whole benchmark grid
+    :return: JSON-serializable dict of benchmark name to stats, plus run metadata
+    """
+    from modules.ans_eval import feature_version, get_nlp, get_tfidf_analyzer
+
+    rng = random.Random(seed)
+    fixtures = load_fixtures(fixture_dirs)
+    sentences = fixture_sentences(fixtures)
+
+    # Load models up front so the first measured call does not pay for it
+    start = time.perf_counter()
+    get_nlp()
+    get_tfidf_analyzer()
+    results = {"startup": {"total_s": time.perf_counter() - start}}
+
+    for name, key, answers in fixtures:
+        log(f"fixture/{name}: {len(answers)} answers")
+        results[f"fixture/{name}"] = bench_evaluate_answers([(key, answer) for answer in answers.values()], track_memory)
+
+    for words in word_counts:
+        pairs = []
+        for _ in range(samples):
+            key = synthetic_text(sentences, words, rng)
+            pairs.append((key, synthetic_answer(key, sentences, rng)))
+        log(f"length/{words}: {samples} answers")
+        results[f"evaluate_answers/{words}w"] = bench_evaluate_answers(pairs, track_memory)
+        for method, stats in bench_methods(pairs, track_memory).items():
+            results[f"method/{method}/{words}w"] = stats
+
+    for size in cohort_sizes:
+        key = synthetic_text(sentences, COHORT_ANSWER_WORDS, rng)
+        answers = [synthetic_answer(key, sentences, rng) for _ in range(size)]
+        log(f"cohort/{size}: {size} answers of {COHORT_ANSWER_WORDS} words")
+        results[f"evaluate_batch/{size}"] = bench_cohort(key, answers, track_memory)
+
+    return {
+        "format": BASELINE_FORMAT,
+        "meta": {
+            "created": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "feature_version": feature_version(),
+            "word_counts": list(word_counts),
+            "cohort_sizes": list(cohort_sizes),
+            "samples": samples,
+            "seed": seed
+        },
+        "results": results
+    }
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Lists the benchmarks that got slower or used more memory than the baseline by more
+    than tolerance (a fraction)
+    :return: List of (benchmark, metric, baseline value, current value)
+    """
+    # Lower is better for these metrics, higher for throughput
+    lower_is_better = ("p50_ms", "p90_ms", "peak_bytes")
+    regressions = []
+    for name, stats in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        for metric in lower_is_better:
+            old, new = before.get(metric), stats.get(metric)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append((name, metric, old, new))
+        old, new = before.get("throughput_per_s"), stats.get("throughput_per_s")
+        if old and new is not None and new < old / (1 + tolerance):
+            regressions.append((name, "throughput_per_s", old, new))
+    return regressions
+
+def format_results(report):
+    """
+    Human-readable table of a benchmark report
+    """
+    lines = [f"{'benchmark':<32} {'n':>5} {'per s':>9} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'peak MB':>9}"]
+    for name, stats in report["results"].items():
+        if "n" not in stats:
+            lines.append(f"{name:<32} {stats['total_s']:.2f}s")
+            continue
+
+        def number(value, scale=1.0, digits=1):
+            return f"{value / scale:.{digits}f}" if value is not None else "-"
+
+        lines.append(
+            f"{name:<32} {stats['n']:>5} {number(stats['throughput_per_s']):>9} {number(stats['p50_ms']):>10} "
+            f"{number(stats['p90_ms']):>10} {number(stats['p99_ms']):>10} {number(stats['peak_bytes'], 1024 * 1024):>9}"
+        )
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark answer evaluation by answer length and cohort size")
+    parser.add_argument("--words", type=int, nargs="+", default=list(DEFAULT_WORD_COUNTS),
+                        help="Answer lengths in words")
+    parser.add_argument("--cohorts", type=int, nargs="+", default=list(DEFAULT_COHORT_SIZES),
+                        help="Cohort sizes in students")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="Answers per answer length")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpora")
+    parser.add_argument("--fixtures", nargs="+", default=list(FIXTURE_DIRS), help="Docx answer set directories")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurements")
+    parser.add_argument("--output", help="Write the results to this baseline file")
+    parser.add_argument("--compare", help="Baseline file to check the results against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.words, args.cohorts, args.samples, args.seed, not args.no_memory, args.fixtures,
+                            log=lambda message: print(message, file=sys.stderr))
+    print(format_results(report))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.tolerance)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.4g} -> {new:.4g}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
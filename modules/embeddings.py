@@ -0,0 +1,308 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+# Sentence-transformers model and encoding settings, overridable through the environment
+SENTENCE_MODEL = os.getenv("SAS_SENTENCE_MODEL", "all-MiniLM-L6-v2")
+ENCODE_BATCH_SIZE = 128
+
+# Sentence-transformer models truncate long inputs, so answers are embedded in windows
+SENTENCE_CHUNK_CHARS = 1000
+
+def iter_chunks(sentences, max_chars):
+    """
+    Yields sentence-aligned windows of at most max_chars characters.
+    Consecutive sentences are joined with spaces; a sentence longer than max_chars is
+    split at word boundaries (or hard-cut if a single word is longer still).
+    """
+    window = ""
+    for sentence in sentences:
+        if not sentence:
+            continue
+        if len(sentence) > max_chars:
+            if window:
+                yield window
+                window = ""
+            piece = ""
+            for word in sentence.split(" "):
+                while len(word) > max_chars:
+                    if piece:
+                        yield piece
+                        piece = ""
+                    yield word[:max_chars]
+                    word = word[max_chars:]
+                if piece and len(piece) + 1 + len(word) > max_chars:
+                    yield piece
+                    piece = word
+                else:
+                    piece = f"{piece} {word}" if piece else word
+            if piece:
+                yield piece
+        elif window and len(window) + 1 + len(sentence) > max_chars:
+            yield window
+            window = sentence
+        else:
+            window = f"{window} {sentence}" if window else sentence
+    if window:
+        yield window
+
+class ChunkPooler:
+    """
+    Running mean- or max-pool of the chunk vectors of one document, so memory stays
+    constant however many chunks a long answer has. Mean pooling is weighted by the
+    number of tokens in each chunk.
+    """
+    def __init__(self, mode="mean"):
+        if mode not in ("mean", "max"):
+            raise ValueError(f"Unknown pooling mode: {mode}")
+        self.mode = mode
+        self.chunks = 0
+        self.weight = 0
+        self._first = None
+        self._pooled = None
+
+    def add(self, vector, weight=1):
+        """
+        Adds the vector of one chunk covering weight tokens.
+        """
+        vector = np.asarray(vector)
+        self.chunks += 1
+        self.weight += weight
+        if self._first is None:
+            self._first = vector
+        if self.mode == "max":
+            self._pooled = vector.astype(np.float64) if self._pooled is None else np.maximum(self._pooled, vector)
+        elif weight:
+            weighted = vector.astype(np.float64) * weight
+            self._pooled = weighted if self._pooled is None else self._pooled + weighted
+
+    def result(self):
+        """
+        Returns the pooled vector (a single chunk's vector is returned unchanged).
+        """
+        if self.chunks <= 1 or self._pooled is None:
+            return self._first
+        if self.mode == "max":
+            return self._pooled.astype(np.float32)
+        return (self._pooled / self.weight).astype(np.float32)
+
+class VectorStore:
+    """
+    Append-only store of embedding vectors in a memory-mapped float32 file,
+    keyed by a hash of the model name and the embedded text.
+    """
+    def __init__(self, directory, dim):
+        self.directory = directory
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+
+        self._index = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("dim") != dim:
+                raise ValueError(f"Vector store {directory} holds {stored.get('dim')}-d vectors, not {dim}-d")
+            self._index = stored["rows"]
+        self._mmap = None
+
+    @staticmethod
+    def make_key(model_name, text):
+        """
+        Returns the content hash a vector is stored under.
+        """
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def _matrix(self):
+        """
+        Memory-maps the vectors file, remapping it after new rows were appended.
+        """
+        rows = len(self._index)
+        if rows == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self._mmap is None or self._mmap.shape[0] != rows:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def get_many(self, keys):
+        """
+        Returns a dict with the stored vector of every key that is present.
+        """
+        with self._lock:
+            matrix = self._matrix()
+            return {key: np.array(matrix[self._index[key]]) for key in keys if key in self._index}
+
+    def add_many(self, vectors):
+        """
+        Appends a dict of key to vector, skipping keys that are already stored.
+        """
+        with self._lock:
+            new = [(key, vector) for key, vector in vectors.items() if key not in self._index]
+            if not new:
+                return
+            block = np.asarray([vector for _, vector in new], dtype=np.float32).reshape(len(new), self.dim)
+            with open(self._vectors_path, "ab") as f:
+                f.write(block.tobytes())
+            for key, _ in new:
+                self._index[key] = len(self._index)
+
+            # Write the index atomically so a crash never points past the vectors file
+            temp_path = self._index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "rows": self._index}, f)
+            os.replace(temp_path, self._index_path)
+
+class EmbeddingBackend:
+    """
+    Base class of embedding backends: encodes analyzed texts into vectors and
+    scores a whole cohort against the key with one matrix product.
+    """
+    name = "base"
+
+    def encode(self, analyzed_texts):
+        """
+        Returns a float32 matrix with one embedding row per analyzed text.
+        """
+        raise NotImplementedError
+
+    def similarities(self, key_analyzed, students_analyzed):
+        """
+        Returns the cosine similarity of every student answer with the key, clipped to 0-1.
+        """
+        if not students_analyzed:
+            return np.zeros(0)
+        matrix = self.encode([key_analyzed] + list(students_analyzed)).astype(np.float64)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms[:, None]
+        return np.clip(matrix[1:] @ matrix[0], 0.0, 1.0)
+
+class SpacyEmbeddingBackend(EmbeddingBackend):
+    """
+    Reuses the spaCy document vectors computed during text analysis, giving the same
+    scores as calculate_embedding_similarity.
+    """
+    name = "spacy"
+
+    def __init__(self, store_dir=None):
+        # Vectors are already part of the analyzed features, so no store is needed
+        self.store = None
+
+    def encode(self, analyzed_texts):
+        # Empty documents have zero-length vectors, so they become zero rows
+        vectors = [np.asarray(analyzed.vector, dtype=np.float32).ravel() for analyzed in analyzed_texts]
+        matrix = np.zeros((len(vectors), max(len(vector) for vector in vectors)), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            matrix[i, :len(vector)] = vector
+        return matrix
+
+    def similarities(self, key_analyzed, students_analyzed):
+        scores = super().similarities(key_analyzed, students_analyzed)
+        for i, analyzed in enumerate(students_analyzed):
+            # Same special cases as spaCy's Doc.similarity
+            if analyzed.token_count == 0 or key_analyzed.token_count == 0:
+                scores[i] = 0.0
+            elif analyzed.embedding_text == key_analyzed.embedding_text:
+                scores[i] = 1.0
+            elif analyzed.vector_norm == 0 or key_analyzed.vector_norm == 0:
+                scores[i] = 0.0
+        return scores
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Sentence-transformers model encoding raw answers in large CPU batches, optionally
+    int8-quantized. Vectors are kept in a VectorStore so each text is encoded once.
+    """
+    name = "sentence-transformers"
+
+    def __init__(self, model_name=SENTENCE_MODEL, quantize=False, store_dir=None, batch_size=ENCODE_BATCH_SIZE,
+                 chunk_chars=SENTENCE_CHUNK_CHARS, pooling="mean"):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name + ("-int8" if quantize else "")
+        self.batch_size = batch_size
+        self.chunk_chars = chunk_chars
+        self.pooling = pooling
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if quantize:
+            import torch
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        dim = self.model.get_sentence_embedding_dimension()
+        self.store = VectorStore(store_dir, dim) if store_dir else None
+
+    def encode(self, analyzed_texts):
+        model_id = f"{self.model_name}/{self.pooling}-{self.chunk_chars}"
+        keys = [VectorStore.make_key(model_id, analyzed.text) for analyzed in analyzed_texts]
+        stored = self.store.get_many(keys) if self.store else {}
+
+        missing = {}
+        for key, analyzed in zip(keys, analyzed_texts):
+            if key not in stored:
+                missing.setdefault(key, analyzed)
+        if missing:
+            computed = dict(zip(missing, self._encode_chunked(missing.values())))
+            if self.store:
+                self.store.add_many(computed)
+            stored.update(computed)
+
+        return np.vstack([np.asarray(stored[key], dtype=np.float32) for key in keys])
+
+    def _encode_chunked(self, analyzed_texts):
+        """
+        Embeds every answer as pooled sentence-aligned windows, encoding at most
+        batch_size windows at a time so memory stays bounded for long answers.
+        """
+        poolers = []
+        batch = []
+
+        def flush():
+            vectors = self.model.encode(
+                [chunk for chunk, _ in batch],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            for (_, index), vector in zip(batch, vectors):
+                poolers[index].add(vector)
+            batch.clear()
+
+        for analyzed in analyzed_texts:
+            poolers.append(ChunkPooler(self.pooling))
+            for chunk in iter_chunks(analyzed.sentences, self.chunk_chars):
+                batch.append((chunk, len(poolers) - 1))
+                if len(batch) >= self.batch_size:
+                    flush()
+        if batch:
+            flush()
+
+        results = []
+        for pooler in poolers:
+            vector = pooler.result()
+            results.append(vector if vector is not None else np.zeros(self.model.get_sentence_embedding_dimension()))
+        return results
+
+# Available backends by name
+BACKENDS = {
+    "spacy": SpacyEmbeddingBackend,
+    "sentence-transformers": SentenceTransformerBackend,
+    "sentence-transformers-int8": lambda **kwargs: SentenceTransformerBackend(quantize=True, **kwargs)
+}
+
+def register_backend(name, factory):
+    """
+    Makes a custom embedding backend available under name.
+    """
+    BACKENDS[name] = factory
+
+def create_backend(name, **kwargs):
+    """
+    Creates the embedding backend registered under name.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Cache location and size limit, overridable through the environment
+DEFAULT_CACHE_DIR = os.getenv("SAS_CACHE_DIR", ".sas_cache")
+DEFAULT_MAX_BYTES = int(os.getenv("SAS_FEATURE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+class FeatureCache:
+    """
+    Content-addressed on-disk cache of NLP features stored in SQLite.
+    Entries are keyed by a hash of the text plus the model/feature version, and the
+    least recently used entries are evicted once the cache grows past max_bytes.
+    """
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "features.sqlite")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS features (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS features_last_access ON features (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(text, version):
+        """
+        Returns the cache key of a text analyzed with a given model/feature version.
+        """
+        digest = hashlib.sha256()
+        digest.update(version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8", errors="surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None on a miss.
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """
+        Returns a dict with the cached value of every key that is present.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM features WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = pickle.loads(value)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE features SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, value):
+        """
+        Stores a value under key.
+        """
+        self.put_many({key: value})
+
+    def put_many(self, items):
+        """
+        Stores every key/value pair of a dict, then evicts old entries if needed.
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, sqlite3.Binary(blob), len(blob), now))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO features (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Deletes least recently used entries until the cache fits in max_bytes.
+        """
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM features").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM features ORDER BY last_access"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM features WHERE key = ?", stale)
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM features"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM features")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
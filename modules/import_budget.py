@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+
+# Maximum import time per module in milliseconds, measured in a fresh interpreter.
+# Models and API clients load on first use, so importing a module should stay cheap.
+IMPORT_BUDGETS_MS = {
+    "modules.registry": 50,
+    "modules.profiling": 50,
+    "modules.ans_eval": 400,
+    "modules.peer_comparison": 600,
+    "modules.plagiarism_check": 600,
+    "modules.ai_content": 600,
+    "modules.ocr": 100,
+    # The OMR processor needs OpenCV at import time, which is why app.py defers it
+    "modules.omr_processor": 1500
+}
+
+# Libraries that must not be loaded just by importing a module
+LAZY_LIBRARIES = ["spacy", "sklearn", "cv2", "google.generativeai", "google.cloud.vision"]
+
+_MEASURE_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+loaded = [name for name in {lazy!r} if name in sys.modules]
+print(elapsed)
+print(",".join(loaded))
+"""
+
+def measure_import(module, runs=3):
+    """
+    Measures the import time of a module in fresh interpreters.
+    Returns the fastest time in milliseconds and the lazy libraries it loaded eagerly.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = _MEASURE_SCRIPT.format(module=module, lazy=LAZY_LIBRARIES)
+
+    timings = []
+    eager = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout.splitlines()
+        timings.append(float(output[0]))
+        eager = [name for name in output[1].split(",") if name]
+    return min(timings), eager
+
+def check_budgets(budgets=IMPORT_BUDGETS_MS, runs=3):
+    """
+    Measures every module against its budget.
+    Returns a dict of module name to its measurement and whether it is within budget.
+    """
+    results = {}
+    for module, budget in budgets.items():
+        try:
+            elapsed, eager = measure_import(module, runs)
+        except subprocess.CalledProcessError as e:
+            results[module] = {"status": "error", "message": e.stderr.strip().splitlines()[-1]}
+            continue
+        results[module] = {
+            "status": "ok" if elapsed <= budget else "over_budget",
+            "import_ms": elapsed,
+            "budget_ms": budget,
+            "eager_libraries": eager
+        }
+    return results
+
+if __name__ == "__main__":
+    results = check_budgets()
+    failed = False
+    for module, result in results.items():
+        if result["status"] == "error":
+            print(f"{module:28} ERROR  {result['message']}")
+            failed = True
+            continue
+        print(f"{module:28} {result['import_ms']:8.1f} ms / {result['budget_ms']} ms  {result['status']}"
+              + (f"  (eager: {', '.join(result['eager_libraries'])})" if result["eager_libraries"] else ""))
+        failed = failed or result["status"] != "ok"
+    sys.exit(1 if failed else 0)
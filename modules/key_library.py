@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import struct
+import threading
+import time
+from modules.feature_cache import DEFAULT_CACHE_DIR
+
+# Key library location, overridable through the environment
+DEFAULT_LIBRARY_DIR = os.getenv("SAS_KEY_LIBRARY_DIR", os.path.join(DEFAULT_CACHE_DIR, "keys"))
+
+# Binary profile layout: magic, format version, header length, JSON header, pickled features.
+# Bump PROFILE_FORMAT whenever the layout changes; older files are then ignored.
+PROFILE_MAGIC = b"SASKEY"
+PROFILE_FORMAT = 1
+_PREFIX = struct.Struct("<6sHI")
+
+class KeyLibrary:
+    """
+    Local library of analyzed answer keys, one versioned binary profile file per key.
+    The JSON header (name, feature version, text hash) is read without unpickling the
+    features, and loaded profiles are kept in memory until their file changes.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_LIBRARY_DIR
+        self._lock = threading.Lock()
+        self._loaded = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def text_hash(text):
+        """
+        Returns the hash identifying the text a profile was built from.
+        """
+        return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def _path(self, name):
+        """
+        Profile file of a key; the name is slugged and suffixed with its hash so distinct
+        names never share a file.
+        """
+        slug = re.sub(r"[^\w.-]+", "_", name).strip("._")[:80] or "key"
+        digest = hashlib.sha1(name.encode("utf-8", errors="surrogatepass")).hexdigest()[:10]
+        return os.path.join(self.directory, f"{slug}-{digest}.profile")
+
+    def save(self, name, text, features, version):
+        """
+        Stores the analyzed features of an answer key under name, replacing any earlier profile.
+        """
+        header = json.dumps({
+            "name": name,
+            "feature_version": version,
+            "text_hash": self.text_hash(text),
+            "created": time.time()
+        }).encode("utf-8")
+        body = pickle.dumps(features, protocol=pickle.HIGHEST_PROTOCOL)
+
+        path = self._path(name)
+        temp_path = path + ".tmp"
+        with self._lock:
+            # Write atomically so a crash never leaves a truncated profile behind
+            with open(temp_path, "wb") as f:
+                f.write(_PREFIX.pack(PROFILE_MAGIC, PROFILE_FORMAT, len(header)))
+                f.write(header)
+                f.write(body)
+            os.replace(temp_path, path)
+            self._loaded.pop(path, None)
+
+    def _read_header(self, f):
+        """
+        Reads the header of an open profile file, or returns None if it is not a profile
+        in the current format.
+        """
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            return None
+        magic, version, header_size = _PREFIX.unpack(prefix)
+        if magic != PROFILE_MAGIC or version != PROFILE_FORMAT:
+            return None
+        return json.loads(f.read(header_size).decode("utf-8"))
+
+    def info(self, name):
+        """
+        Returns the header of the profile stored under name, or None.
+        """
+        path = self._path(name)
+        try:
+            with open(path, "rb") as f:
+                return self._read_header(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, name, version=None, text=None):
+        """
+        Returns the features stored under name, or None when the key is missing, was
+        analyzed with another feature version, or was built from a text other than text.
+        """
+        path = self._path(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            loaded = self._loaded.get(path)
+            if loaded is None or loaded[0] != mtime:
+                try:
+                    with open(path, "rb") as f:
+                        header = self._read_header(f)
+                        if header is None:
+                            return None
+                        features = pickle.load(f)
+                except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+                    return None
+                loaded = (mtime, header, features)
+                self._loaded[path] = loaded
+
+        _, header, features = loaded
+        if version is not None and header["feature_version"] != version:
+            return None
+        if text is not None and header["text_hash"] != self.text_hash(text):
+            return None
+        return features
+
+    def names(self):
+        """
+        Returns the names of every stored key, sorted.
+        """
+        names = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".profile"):
+                try:
+                    with open(entry.path, "rb") as f:
+                        header = self._read_header(f)
+                except (OSError, ValueError):
+                    header = None
+                if header is not None:
+                    names.append(header["name"])
+        return sorted(names)
+
+    def delete(self, name):
+        """
+        Removes the profile stored under name, if any.
+        """
+        path = self._path(name)
+        with self._lock:
+            self._loaded.pop(path, None)
+            if os.path.exists(path):
+                os.remove(path)
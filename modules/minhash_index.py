@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+from modules.feature_cache import DEFAULT_CACHE_DIR
+
+# Signature settings: NUM_PERM hash functions split into BANDS bands of NUM_PERM // BANDS
+# rows each. Pairs become candidates from a Jaccard similarity of about
+# (1 / BANDS) ** (BANDS / NUM_PERM), 0.42 with these values.
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 3
+SEED = 1
+
+# Estimated Jaccard similarity reported as a near duplicate
+DEFAULT_THRESHOLD = 0.5
+
+# Mersenne prime modulus of the permutation hashes, above any 32-bit shingle hash
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Shingles hashed per step, bounding memory on very long submissions
+_SHINGLE_CHUNK = 4096
+
+WORD = re.compile(r"\w+")
+
+class MinHashIndex:
+    """
+    Persistent MinHash signatures of past submissions with locality-sensitive hashing
+    buckets in SQLite, so new uploads are checked against every earlier cohort by
+    looking up their band hashes instead of comparing with each stored submission.
+    """
+    def __init__(self, path=None, num_perm=NUM_PERM, bands=BANDS, shingle_size=SHINGLE_SIZE, seed=SEED):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "submissions.sqlite")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._lock = threading.Lock()
+
+        # Random linear permutations (a * x + b) mod prime, fixed by the seed; a stays
+        # below 2^31 so the products of 32-bit shingle hashes fit in 64 bits
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                batch TEXT,
+                content_hash TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                added REAL NOT NULL,
+                UNIQUE (name, content_hash)
+            );
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                hash INTEGER NOT NULL,
+                document INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, hash);
+        """)
+
+        # Signatures are only comparable when made with the same settings
+        settings = json.dumps({"num_perm": num_perm, "bands": bands, "shingle_size": shingle_size, "seed": seed})
+        stored = self._conn.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+        if stored is None:
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('settings', ?)", (settings,))
+        elif stored[0] != settings:
+            raise ValueError(f"Index {self.path} was built with settings {stored[0]}, not {settings}")
+        self._conn.commit()
+
+    @staticmethod
+    def content_hash(text):
+        """
+        Returns the hash identifying the exact text of a submission.
+        """
+        return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def _shingle_hashes(self, text):
+        """
+        Unique 32-bit hashes of the overlapping word n-grams of a text.
+        """
+        words = WORD.findall(text.lower())
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)} if words else set()
+        return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                           dtype=np.uint64, count=len(shingles))
+
+    def signature(self, text):
+        """
+        Returns the MinHash signature of a text, or None if it has no words.
+        """
+        hashes = self._shingle_hashes(text)
+        if not hashes.size:
+            return None
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, hashes.size, _SHINGLE_CHUNK):
+            chunk = hashes[start:start + _SHINGLE_CHUNK]
+            permuted = (self._a[:, None] * chunk[None, :] + self._b[:, None]) % _PRIME & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def _band_hashes(self, signature):
+        """
+        Returns one signed 64-bit bucket hash per band of a signature.
+        """
+        return [
+            int.from_bytes(
+                hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).digest(),
+                "little", signed=True
+            )
+            for band in range(self.bands)
+        ]
+
+    def add_many(self, texts, batch=None):
+        """
+        Signs and stores a dict of submission name to text, e.g. one graded batch.
+        A submission already stored with the same name and text is skipped.
+        :return: Number of submissions added
+        """
+        added = 0
+        now = time.time()
+        signed = [(name, text, self.signature(text)) for name, text in texts.items()]
+        with self._lock:
+            for name, text, signature in signed:
+                if signature is None:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO documents (name, batch, content_hash, signature, added) VALUES (?, ?, ?, ?, ?)",
+                    (name, batch, self.content_hash(text), sqlite3.Binary(signature.tobytes()), now)
+                )
+                if not cursor.rowcount:
+                    continue
+                self._conn.executemany(
+                    "INSERT INTO buckets (band, hash, document) VALUES (?, ?, ?)",
+                    [(band, value, cursor.lastrowid) for band, value in enumerate(self._band_hashes(signature))]
+                )
+                added += 1
+            self._conn.commit()
+        return added
+
+    def add(self, name, text, batch=None):
+        """
+        Signs and stores one submission.
+        """
+        return self.add_many({name: text}, batch) == 1
+
+    def stored_batches(self, texts):
+        """
+        Looks up which of a dict of submission name to text are already stored, with the same text.
+        :return: Dict of name to the batch it was stored under
+        """
+        keys = [(name, self.content_hash(text)) for name, text in texts.items()]
+        batches = {}
+        with self._lock:
+            for name, content_hash in keys:
+                row = self._conn.execute(
+                    "SELECT batch FROM documents WHERE name = ? AND content_hash = ?", (name, content_hash)
+                ).fetchone()
+                if row is not None:
+                    batches[name] = row[0]
+        return batches
+
+    def query(self, text, threshold=DEFAULT_THRESHOLD, batch=None, name=None):
+        """
+        Finds stored submissions whose estimated Jaccard similarity with text is at least threshold.
+        Identical texts are reported like any other match (an exact copy is the worst case).
+        :param batch: Batch the text belongs to; submissions stored under it are not reported,
+            so re-checking a batch does not match it against itself
+        :param name: Identity of the submitter; their own earlier submissions are not reported.
+            Only pass a real student identity, not a file name two students can share.
+        :return: List of dicts with name, batch and similarity, most similar first
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return []
+
+        with self._lock:
+            candidates = set()
+            for band, value in enumerate(self._band_hashes(signature)):
+                candidates.update(
+                    row[0] for row in
+                    self._conn.execute("SELECT document FROM buckets WHERE band = ? AND hash = ?", (band, value))
+                )
+            rows = []
+            candidates = list(candidates)
+            # Stay well below SQLite's limit on query parameters
+            for start in range(0, len(candidates), 500):
+                chunk = candidates[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT name, batch, signature FROM documents WHERE id IN ({placeholders})", chunk
+                ).fetchall())
+
+        matches = []
+        for stored_name, stored_batch, stored_signature in rows:
+            if (batch is not None and stored_batch == batch) or (name is not None and stored_name == name):
+                continue
+            similarity = float(np.mean(np.frombuffer(stored_signature, dtype=np.uint32) == signature))
+            if similarity >= threshold:
+                matches.append({"name": stored_name, "batch": stored_batch, "similarity": similarity})
+        return sorted(matches, key=lambda match: -match["similarity"])
+
+    def query_many(self, texts, threshold=DEFAULT_THRESHOLD, batch=None):
+        """
+        Queries every submission of a dict of name to text, all from one batch.
+        :return: Dict of name to its list of matches
+        """
+        return {name: self.query(text, threshold, batch) for name, text in texts.items()}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
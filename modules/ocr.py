@@ -1,12 +1,16 @@
 import os
-from google.cloud import vision
-from pdf2image import convert_from_path
 import tempfile
 import io
-from PIL import Image
+from modules.registry import get_resource
 
-# Initialize the Google Cloud Vision client
-client = vision.ImageAnnotatorClient.from_service_account_json('key.json')
+def _load_vision_client():
+    """Initialize the Google Cloud Vision client from key.json"""
+    from google.cloud import vision
+    return vision.ImageAnnotatorClient.from_service_account_json('key.json')
+
+def get_vision_client():
+    """Shared Google Cloud Vision client, created on first OCR request"""
+    return get_resource("google:vision_client", _load_vision_client)
 
 def perform_ocr(file_path, log_callback=None):
     """Perform OCR using Google Cloud Vision API"""
@@ -14,6 +18,9 @@ def perform_ocr(file_path, log_callback=None):
         if log_callback:
             log_callback("Starting OCR processing...\n")
 
+        from google.cloud import vision
+        client = get_vision_client()
+
         # Check file extension
         file_ext = os.path.splitext(file_path)[1].lower()
         
@@ -23,6 +30,8 @@ def perform_ocr(file_path, log_callback=None):
                 log_callback("Converting PDF to images...\n")
             
             try:
+                from pdf2image import convert_from_path
+
                 # Convert PDF to images
                 with tempfile.TemporaryDirectory() as temp_dir:
                     images = convert_from_path(file_path)
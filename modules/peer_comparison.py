@@ -1,74 +1,49 @@
+import hashlib
 import os
-import PyPDF2
-import docx
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from collections import Counter
+import numpy as np
+from modules.minhash_index import MinHashIndex
+from modules.registry import get_resource
+from modules.text_extraction import extract_texts
+from modules.winnowing import MIN_PASSAGE_CHARS, find_copied_passages
 
-# Function to extract text from PDF files
-def extract_text_from_pdf(pdf_path):
-    """
-    Extracts text from a PDF file using PyPDF2.
-    """
-    text = ""
-    try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                text += page.extract_text()
-    except Exception as e:
-        print(f"Error extracting text from {pdf_path}: {e}")
-    return text
-
-# Function to extract text from Word documents
-def extract_text_from_docx(docx_path):
-    """
-    Extracts text from a Word document using python-docx.
-    """
-    text = ""
-    try:
-        doc = docx.Document(docx_path)
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-    except Exception as e:
-        print(f"Error extracting text from {docx_path}: {e}")
-    return text
-
-# Function to extract text from any supported file type
-def extract_text(file_path):
-    """
-    Extracts text from a file based on its extension.
-    Supports PDF, DOCX, and plain text files.
-    """
-    if file_path.lower().endswith('.pdf'):
-        return extract_text_from_pdf(file_path)
-    elif file_path.lower().endswith('.docx'):
-        return extract_text_from_docx(file_path)
-    else:
-        # Assume it's a plain text file
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except Exception as e:
-            print(f"Error reading file {file_path}: {e}")
-            return ""
-
-def compare_files(file_paths):
+# Rows of the similarity matrix computed at a time in sparse (top-k/threshold) mode
+BLOCK_SIZE = 256
+
+# Above this many files the app keeps only each file's closest peers
+SPARSE_MIN_FILES = 50
+DEFAULT_TOP_K = 5
+
+# Copied passages the app lists per pair of files, longest first
+MAX_SHOWN_PASSAGES = 20
+
+# Estimated Jaccard similarity to a past submission reported as a likely copy
+HISTORY_THRESHOLD = 0.5
+
+def compare_files(file_paths, top_k=None, threshold=None, block_size=BLOCK_SIZE, texts=None):
     """
     Compares the uploaded files for similarity using Cosine Similarity (TF-IDF).
     Compares each pair of files and returns a similarity score.
+    With top_k and/or threshold, similarities are computed block_size rows at a time and
+    only each file's top_k most similar peers and/or the pairs scoring at least threshold
+    are kept, so memory stays near-linear in the number of files; the result is then a
+    PeerSimilarities instead of a dict of every pair.
+    texts optionally maps each file path to its already extracted text.
     """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     if len(file_paths) < 2:
         raise ValueError("At least two files are required for comparison.")
     
-    texts = []
-    
-    # Extract text from each file
-    for file_path in file_paths:
-        texts.append(extract_text(file_path))
+    texts = texts or extract_texts(file_paths)
     
     # Create a TF-IDF Vectorizer and transform the documents into vectors
     vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(texts)
+    tfidf_matrix = vectorizer.fit_transform([texts[file_path] for file_path in file_paths])
+
+    if top_k is not None or threshold is not None:
+        return sparse_similarities(file_paths, tfidf_matrix, top_k, threshold, block_size)
     
     # Calculate pairwise cosine similarity for all files
     cosine_sim = cosine_similarity(tfidf_matrix)
@@ -81,3 +56,150 @@ def compare_files(file_paths):
                 similarity_results[(file1, file2)] = cosine_sim[i][j]
     
     return similarity_results
+
+def sparse_similarities(file_paths, tfidf_matrix, top_k=None, threshold=None, block_size=BLOCK_SIZE):
+    """
+    Computes the cosine similarities of L2-normalized TF-IDF rows one block of rows at a
+    time, keeping only each row's top_k peers and/or the pairs at or above threshold.
+    """
+    n = tfidf_matrix.shape[0]
+    kept_keys = []
+    kept_scores = []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        # Rows are unit length, so the dot products are the cosine similarities
+        block = (tfidf_matrix[start:stop] @ tfidf_matrix.T).toarray()
+        rows = np.arange(start, stop)
+        block[rows - start, rows] = -np.inf  # Skip self-comparisons
+
+        if top_k is not None and top_k < n - 1:
+            cols = np.argpartition(-block, top_k - 1, axis=1)[:, :top_k] if top_k > 0 \
+                else np.empty((stop - start, 0), dtype=np.intp)
+            block_rows = np.repeat(rows, cols.shape[1])
+            cols = cols.ravel()
+        else:
+            block_rows, cols = np.nonzero(block > -np.inf)
+            block_rows = block_rows + start
+        scores = block[block_rows - start, cols]
+
+        keep = scores > -np.inf
+        if threshold is not None:
+            keep &= scores >= threshold
+        block_rows, cols, scores = block_rows[keep], cols[keep], scores[keep]
+
+        # Store each pair once, with the lower index first
+        low, high = np.minimum(block_rows, cols), np.maximum(block_rows, cols)
+        kept_keys.append(low.astype(np.int64) * n + high)
+        kept_scores.append(scores)
+
+    keys = np.concatenate(kept_keys) if kept_keys else np.empty(0, dtype=np.int64)
+    scores = np.concatenate(kept_scores) if kept_scores else np.empty(0)
+    keys, first = np.unique(keys, return_index=True)
+    return PeerSimilarities(file_paths, keys // n, keys % n, scores[first])
+
+class PeerSimilarities:
+    """
+    Sparse peer comparison result: the kept pairs of files as parallel index and score
+    arrays. items() yields ((file1, file2), similarity) like the dict compare_files
+    returns by default, most similar pairs first.
+    """
+    def __init__(self, file_paths, rows, cols, scores):
+        self.file_paths = list(file_paths)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.cols = np.asarray(cols, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def items(self):
+        """
+        Yields ((file1, file2), similarity) for every kept pair, most similar first.
+        """
+        for index in np.argsort(-self.scores, kind="stable"):
+            yield (self.file_paths[self.rows[index]], self.file_paths[self.cols[index]]), float(self.scores[index])
+
+    def neighbours(self, file_path):
+        """
+        Returns the kept peers of one file as (other file, similarity), most similar first.
+        """
+        i = self.file_paths.index(file_path)
+        mask = (self.rows == i) | (self.cols == i)
+        others = np.where(self.rows[mask] == i, self.cols[mask], self.rows[mask])
+        order = np.argsort(-self.scores[mask], kind="stable")
+        return [(self.file_paths[others[j]], float(self.scores[mask][j])) for j in order]
+
+    def to_sparse(self):
+        """
+        Returns the kept similarities as a symmetric SciPy CSR matrix.
+        """
+        from scipy.sparse import coo_matrix
+
+        n = len(self.file_paths)
+        return coo_matrix(
+            (np.concatenate([self.scores, self.scores]),
+             (np.concatenate([self.rows, self.cols]), np.concatenate([self.cols, self.rows]))),
+            shape=(n, n)
+        ).tocsr()
+
+def compare_passages(file_paths, min_chars=MIN_PASSAGE_CHARS, texts=None, boilerplate=()):
+    """
+    Finds the passages copied between the uploaded files with winnowing fingerprints,
+    which also catches copied passages that were reordered or reformatted.
+    :return: Dict of (file1, file2) to a dict with "similarity" (share of the shorter file
+        that was copied) and "passages" (matched character spans in both files and the text)
+    :param boilerplate: Texts the files may all quote, e.g. the answer key; shared only
+        through these, a passage is not reported
+    """
+    texts = texts or extract_texts(file_paths)
+    return find_copied_passages({file_path: texts[file_path] for file_path in file_paths}, min_chars,
+                                boilerplate=boilerplate)
+
+def get_submission_index():
+    """
+    Shared MinHash index of every submission checked so far, opened on first use.
+    """
+    return get_resource("index:submissions", MinHashIndex)
+
+def upload_batch(texts, index=None):
+    """
+    Returns a batch label that stays the same when an upload set is checked again, e.g. in a
+    new session: the batch most of its submissions were already stored under (by name and
+    text), otherwise a label derived from the content of the whole set.
+    :param texts: Dict of submission name (as stored in the index) to text
+    """
+    index = index if index is not None else get_submission_index()
+    counts = Counter(batch for batch in index.stored_batches(texts).values() if batch is not None)
+    if counts:
+        # One copied file must not pull a new class into an earlier batch, only a re-check can
+        batch, count = counts.most_common(1)[0]
+        if 2 * count > len(texts):
+            return batch
+    digest = hashlib.sha256()
+    for content_hash in sorted(index.content_hash(text) for text in texts.values()):
+        digest.update(content_hash.encode("ascii"))
+    return f"upload {digest.hexdigest()[:12]}"
+
+def compare_with_history(file_paths, names=None, index=None, threshold=HISTORY_THRESHOLD, batch=None, add=True,
+                         texts=None):
+    """
+    Checks files against the past submissions in the MinHash index (earlier cohorts and
+    other sections), then adds them to it so later batches are checked against them too.
+    :param names: Names to store the files under (defaults to their base names)
+    :param batch: Label of this batch stored with its submissions, e.g. the assignment or
+        section; earlier submissions of the same batch are not reported, so pass the same label
+        when re-checking a batch (e.g. after adding late files). Defaults to upload_batch.
+    :param texts: Already extracted texts by file path (extracted through the shared cache otherwise)
+    :return: Dict of file path to its matches (dicts with name, batch and similarity)
+    """
+    index = index if index is not None else get_submission_index()
+    names = names or [os.path.basename(file_path) for file_path in file_paths]
+    extracted = texts or extract_texts(file_paths)
+    texts = {name: extracted[file_path] for name, file_path in zip(names, file_paths)}
+    batch = batch or upload_batch(texts, index)
+
+    # Query before adding so a batch is not matched against itself
+    matches = index.query_many(texts, threshold, batch)
+    if add:
+        index.add_many(texts, batch)
+    return {file_path: matches[name] for name, file_path in zip(names, file_paths)}
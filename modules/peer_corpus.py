@@ -0,0 +1,332 @@
+import hashlib
+import os
+import pickle
+import numpy as np
+from modules.feature_cache import DEFAULT_CACHE_DIR
+from modules.registry import get_resource
+
+# Where the app keeps the peer comparison corpus between sessions
+DEFAULT_CORPUS_PATH = os.path.join(DEFAULT_CACHE_DIR, "peer_corpus.pkl")
+
+# Hashed term space of the TF-IDF vectors; large enough that collisions are negligible
+N_FEATURES = 2 ** 20
+
+# Bump whenever the saved corpus layout changes; older files are then ignored
+CORPUS_FORMAT = 2
+
+# Removed documents leave empty slots behind; once they make up more than this share of
+# the slots (and on every save) the corpus is compacted, so adds cost only live documents
+MAX_REMOVED_SHARE = 0.25
+
+def _load_term_counter():
+    """
+    Stateless term counter with the same tokenization as compare_files' TfidfVectorizer
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(stop_words='english', n_features=N_FEATURES, alternate_sign=False, norm=None)
+
+def get_term_counter():
+    """
+    Shared hashed term counter, built on first use
+    """
+    return get_resource("sklearn:peer_term_counter", _load_term_counter)
+
+class PeerCorpus:
+    """
+    Stateful peer comparison corpus that keeps the extracted text, term counts and
+    norm terms of every document, so a late submission only costs its own row of
+    similarities instead of re-extracting every file and refitting TF-IDF.
+
+    Similarities match a TfidfVectorizer fitted on the whole current corpus. With the
+    smoothed IDF ln((1 + n) / (1 + df)) + 1 = ln(1 + n) + a, where a = 1 - ln(1 + df)
+    only changes for the terms of an added or removed document, each squared norm is
+    kept as three sums (of c^2, c^2 * a and c^2 * a^2 over the document's term counts c)
+    that are updated through the postings of those terms alone.
+    Pair similarities are computed when the later document of the pair is added, with
+    the IDF of that moment; rescore() brings them all up to date.
+    """
+    def __init__(self, top_k=None):
+        self.top_k = top_k
+        self.names = []
+        self.texts = []
+        self.content_hashes = []
+        self.terms = []
+        self.active = []
+        self.df = {}
+        # Term to parallel lists of the documents containing it and its counts there
+        self.postings = {}
+        self.sums = np.zeros((0, 3))
+        self.neighbours = []
+        # Reverse of neighbours: the documents whose neighbours hold each document. With
+        # top_k the lists are one-sided, so a document can be listed without listing back.
+        self.listed_by = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def _a(self, df):
+        """
+        Corpus-size independent part of the IDF of terms with document frequency df.
+        """
+        return 1.0 - np.log1p(df)
+
+    def _gather(self, terms, exclude=None):
+        """
+        Postings of terms as parallel arrays of document, term position in terms, and count.
+        """
+        postings = [self.postings.get(term, ((), ())) for term in terms]
+        lengths = [len(term_documents) for term_documents, _ in postings]
+        if not sum(lengths):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        documents = np.concatenate([np.asarray(term_documents, dtype=np.int64) for term_documents, _ in postings])
+        counts = np.concatenate([np.asarray(term_counts, dtype=np.float64) for _, term_counts in postings])
+        positions = np.repeat(np.arange(len(terms)), lengths)
+        if exclude is not None:
+            keep = documents != exclude
+            documents, positions, counts = documents[keep], positions[keep], counts[keep]
+        return documents, positions, counts
+
+    def _update_sums(self, postings, old_df, new_df):
+        """
+        Updates the norm sums of the documents in the postings of some terms (from
+        _gather) after the document frequencies of those terms changed from old_df to new_df.
+        """
+        documents, positions, counts = postings
+        if not len(documents):
+            return
+        old_a, new_a = self._a(old_df), self._a(new_df)
+        squares = counts ** 2
+        size = len(self.sums)
+        self.sums[:, 1] += np.bincount(documents, squares * (new_a - old_a)[positions], minlength=size)
+        self.sums[:, 2] += np.bincount(documents, squares * (new_a ** 2 - old_a ** 2)[positions], minlength=size)
+
+    def _norms(self, documents):
+        """
+        Current TF-IDF norms of documents.
+        """
+        c = np.log1p(len(self))
+        sums = self.sums[documents]
+        return np.sqrt(np.maximum(sums[:, 2] + 2 * c * sums[:, 1] + c * c * sums[:, 0], 0.0))
+
+    def _row(self, document, postings=None):
+        """
+        Current similarities of one document with every other active document.
+        :param postings: Postings of the document's terms without the document itself, if
+            already gathered
+        :return: Dict of other document to similarity
+        """
+        terms, counts = self.terms[document]
+        if not len(terms):
+            return {}
+        df = np.asarray([self.df[term] for term in terms.tolist()], dtype=np.float64)
+        idf = np.log1p(len(self)) + self._a(df)
+        documents, positions, other_counts = postings or self._gather(terms.tolist(), exclude=document)
+        if not len(documents):
+            return {}
+
+        # Dot products through the shared terms only
+        dots = np.bincount(documents, other_counts * (counts * idf ** 2)[positions], minlength=len(self.names))
+        others = np.unique(documents)
+        norm = self._norms([document])[0]
+        norms = self._norms(others)
+        scores = np.where(norms * norm > 0, dots[others] / np.maximum(norms * norm, 1e-300), 0.0)
+        return dict(zip(others.tolist(), scores.tolist()))
+
+    def _keep(self, document, other, score):
+        """
+        Records a similarity in a document's neighbours, keeping at most top_k of them.
+        """
+        neighbours = self.neighbours[document]
+        neighbours[other] = score
+        self.listed_by[other].add(document)
+        if self.top_k is not None and len(neighbours) > self.top_k:
+            evicted = min(neighbours, key=neighbours.get)
+            del neighbours[evicted]
+            self.listed_by[evicted].discard(document)
+
+    def add(self, name, text):
+        """
+        Adds a document, replacing any earlier document of the same name, and computes
+        only its row of similarities against the corpus.
+        :return: Dict of other document name to similarity
+        """
+        if name in self._index:
+            self.remove(name)
+
+        matrix = get_term_counter().transform([text])
+        terms = matrix.indices.astype(np.int64)
+        counts = matrix.data.astype(np.float64)
+
+        document = len(self.names)
+        self._index[name] = document
+        self.names.append(name)
+        self.texts.append(text)
+        self.content_hashes.append(hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest())
+        self.terms.append((terms, counts))
+        self.active.append(True)
+        self.neighbours.append({})
+        self.listed_by.append(set())
+
+        # New document frequencies shift the IDF of this document's terms for the others
+        postings = self._gather(terms.tolist())
+        old_df = np.asarray([self.df.get(term, 0) for term in terms.tolist()], dtype=np.float64)
+        self._update_sums(postings, old_df, old_df + 1)
+        for term, count in zip(terms.tolist(), counts.tolist()):
+            self.df[term] = self.df.get(term, 0) + 1
+            term_documents, term_counts = self.postings.setdefault(term, ([], []))
+            term_documents.append(document)
+            term_counts.append(count)
+
+        squares = counts ** 2
+        new_a = self._a(old_df + 1)
+        self.sums = np.vstack([self.sums, [squares.sum(), (squares * new_a).sum(), (squares * new_a ** 2).sum()]])
+
+        row = self._row(document, postings)
+        for other, score in row.items():
+            self._keep(document, other, score)
+            self._keep(other, document, score)
+        return {self.names[other]: score for other, score in row.items()}
+
+    def remove(self, name):
+        """
+        Removes a document; neighbour lists that lose an entry are refilled.
+        """
+        document = self._index.pop(name)
+        self.active[document] = False
+        terms, counts = self.terms[document]
+        for term in terms.tolist():
+            term_documents, term_counts = self.postings[term]
+            i = term_documents.index(document)
+            del term_documents[i], term_counts[i]
+        old_df = np.asarray([self.df[term] for term in terms.tolist()], dtype=np.float64)
+        for term in terms.tolist():
+            self.df[term] -= 1
+        self._update_sums(self._gather(terms.tolist()), old_df, old_df - 1)
+        self.sums[document] = 0.0
+        self.texts[document] = ""
+        self.terms[document] = (np.empty(0, dtype=np.int64), np.empty(0))
+
+        for other in self.neighbours[document]:
+            self.listed_by[other].discard(document)
+        self.neighbours[document] = {}
+        # Every document listing this one loses the entry, whether or not it was listed back
+        affected = sorted(self.listed_by[document])
+        self.listed_by[document] = set()
+        for other in affected:
+            del self.neighbours[other][document]
+            if self.top_k is not None:
+                self._refill(other)
+
+        if len(self.names) - len(self) > MAX_REMOVED_SHARE * len(self.names):
+            self.compact()
+
+    def compact(self):
+        """
+        Drops the slots of removed documents and renumbers the remaining ones.
+        """
+        keep = [document for document, active in enumerate(self.active) if active]
+        if len(keep) == len(self.names):
+            return
+        remap = np.full(len(self.names), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        self.names = [self.names[document] for document in keep]
+        self.texts = [self.texts[document] for document in keep]
+        self.content_hashes = [self.content_hashes[document] for document in keep]
+        self.terms = [self.terms[document] for document in keep]
+        self.active = [True] * len(keep)
+        self.sums = self.sums[keep]
+        # Removed documents are already gone from every neighbour list and posting
+        self.neighbours = [{int(remap[other]): score for other, score in self.neighbours[document].items()}
+                           for document in keep]
+        self.listed_by = [{int(remap[other]) for other in self.listed_by[document]} for document in keep]
+        for term in [term for term, count in self.df.items() if not count]:
+            del self.df[term]
+            del self.postings[term]
+        for term, (term_documents, term_counts) in self.postings.items():
+            self.postings[term] = (remap[term_documents].tolist(), term_counts)
+        self._index = {name: document for document, name in enumerate(self.names)}
+
+    def _refill(self, document):
+        """
+        Recomputes a document's neighbours from its current row of similarities.
+        """
+        for other in self.neighbours[document]:
+            self.listed_by[other].discard(document)
+        self.neighbours[document] = {}
+        for other, score in self._row(document).items():
+            self._keep(document, other, score)
+
+    def add_files(self, file_paths, extract_text):
+        """
+        Brings the corpus in line with a set of files: files whose name and bytes are
+        already in the corpus are skipped without extracting their text, changed or new
+        files are (re)added, and documents not among the files are removed.
+        :param extract_text: Function returning the text of a file path
+        :return: Names of the files that were (re)added
+        """
+        added = []
+        for file_path in file_paths:
+            with open(file_path, "rb") as f:
+                file_hash = "file:" + hashlib.sha256(f.read()).hexdigest()
+            document = self._index.get(file_path)
+            if document is not None and self.content_hashes[document] == file_hash:
+                continue
+            self.add(file_path, extract_text(file_path))
+            self.content_hashes[self._index[file_path]] = file_hash
+            added.append(file_path)
+
+        for name in [name for name in self._index if name not in set(file_paths)]:
+            self.remove(name)
+        return added
+
+    def similarities(self):
+        """
+        Returns {(name1, name2): similarity} for every kept pair, like compare_files.
+        """
+        pairs = {}
+        for document, neighbours in enumerate(self.neighbours):
+            for other, score in neighbours.items():
+                first, second = min(document, other), max(document, other)
+                pairs[(self.names[first], self.names[second])] = score
+        return pairs
+
+    def rescore(self):
+        """
+        Recomputes every kept similarity with the IDF of the current corpus.
+        """
+        for document in self._index.values():
+            self._refill(document)
+
+    def save(self, path=DEFAULT_CORPUS_PATH):
+        """
+        Writes the corpus to path atomically, without the slots of removed documents.
+        """
+        self.compact()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump((CORPUS_FORMAT, vars(self)), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CORPUS_PATH, top_k=None):
+        """
+        Reads a corpus saved with save(), or returns an empty one if there is none (or it
+        was saved in another format or with another top_k).
+        """
+        corpus = cls(top_k)
+        try:
+            with open(path, "rb") as f:
+                version, state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return corpus
+        if version == CORPUS_FORMAT and state.get("top_k") == top_k:
+            corpus.__dict__.update(state)
+        return corpus
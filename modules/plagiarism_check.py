@@ -1,70 +1,28 @@
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
-import PyPDF2
-import docx
+from modules.text_extraction import PROMPT_CHAR_LIMIT, extract_texts
 
 load_dotenv()
 
-def extract_text_from_pdf(file_path):
-    """
-    Extracts text from a PDF file using PyPDF2.
-    """
-    content = ""
-    try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                content += page.extract_text() + "\n"
-    except Exception as e:
-        print(f"Error extracting text from PDF {file_path}: {e}")
-    return content
-
-def extract_text_from_docx(file_path):
-    """
-    Extracts text from a Word document using python-docx.
-    """
-    content = ""
-    try:
-        doc = docx.Document(file_path)
-        for paragraph in doc.paragraphs:
-            content += paragraph.text + "\n"
-    except Exception as e:
-        print(f"Error extracting text from Word document {file_path}: {e}")
-    return content
-
-def extract_text(file_path):
-    """
-    Extracts text from a file based on its extension.
-    Supports PDF, DOCX, and plain text files.
-    """
-    if file_path.lower().endswith('.pdf'):
-        return extract_text_from_pdf(file_path)
-    elif file_path.lower().endswith('.docx'):
-        return extract_text_from_docx(file_path)
-    else:
-        # Assume it's a plain text file
-        try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                return file.read()
-        except Exception as e:
-            print(f"Error reading file {file_path}: {e}")
-            return ""
-
-def check_plagiarism(file_paths):
+def check_plagiarism(file_paths, texts=None):
     """
     Checks for potential plagiarism using Gemini API.
     Returns a simple summary for each file.
+    texts optionally maps each file path to its already extracted text.
     """
+    import google.generativeai as genai
+
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
     genai.configure(api_key=GOOGLE_API_KEY)
     model = genai.GenerativeModel('gemini-2.0-flash')
 
+    # Only the prompt-sized prefix of each file is needed (and parsed)
+    texts = texts or extract_texts(file_paths, max_chars=PROMPT_CHAR_LIMIT)
     results = {}
 
     for file_path in file_paths:
         try:
-            content = extract_text(file_path)
+            content = texts[file_path][:PROMPT_CHAR_LIMIT]
 
             if not content.strip():
                 raise ValueError("No text content could be extracted from the file")
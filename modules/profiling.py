@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from modules.registry import get_resource
+
+# Where the app writes evaluation profiles; profiling is off when unset
+PROFILE_PATH = os.getenv("SAS_PROFILE_PATH")
+PROFILE_MEMORY = os.getenv("SAS_PROFILE_MEMORY", "0") == "1"
+
+# Profiler that stage() records into, if any
+_active = None
+_active_lock = threading.Lock()
+
+class StageProfiler:
+    """
+    Records wall time, call counts and optionally tracemalloc peak memory for each
+    named stage of the evaluation pipeline, in total and per evaluated batch.
+    """
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.stages = {}
+        self.batches = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # One (previously active profiler, started tracing) entry per open `with`, so the
+        # profiler can be re-entered, e.g. by evaluate_batch inside an app-level block
+        self._entries = []
+
+    def __enter__(self):
+        """
+        Makes this the profiler that stage() records into.
+        """
+        global _active
+        with _active_lock:
+            started_tracing = self.track_memory and not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            self._entries.append((_active, started_tracing))
+            _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        with _active_lock:
+            previous, started_tracing = self._entries.pop()
+            # Only the entry that started tracing stops it
+            if started_tracing:
+                tracemalloc.stop()
+            _active = previous
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as one call of stage name.
+        """
+        tracing = self.track_memory and tracemalloc.is_tracing()
+        frames = self._frames()
+        if tracing:
+            # Hand the peak so far to the enclosing stage before resetting it for this one
+            current, peak = tracemalloc.get_traced_memory()
+            if frames:
+                frames[-1]["peak"] = max(frames[-1]["peak"], peak - frames[-1]["base"])
+            tracemalloc.reset_peak()
+            frames.append({"base": current, "peak": 0})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak_bytes = None
+            if tracing:
+                frame = frames.pop()
+                _, peak = tracemalloc.get_traced_memory()
+                peak_bytes = max(frame["peak"], peak - frame["base"])
+                if frames:
+                    frames[-1]["peak"] = max(frames[-1]["peak"], frame["base"] + peak_bytes - frames[-1]["base"])
+            self._record(name, elapsed, peak_bytes)
+
+    def _frames(self):
+        """
+        Stack of memory measurements of the stages open in this thread.
+        """
+        if not hasattr(self._local, "frames"):
+            self._local.frames = []
+        return self._local.frames
+
+    def _record(self, name, elapsed, peak_bytes):
+        with self._lock:
+            stats = self.stages.setdefault(name, {"calls": 0, "total_s": 0.0, "max_s": 0.0, "peak_bytes": None})
+            stats["calls"] += 1
+            stats["total_s"] += elapsed
+            stats["max_s"] = max(stats["max_s"], elapsed)
+            if peak_bytes is not None:
+                stats["peak_bytes"] = max(stats["peak_bytes"] or 0, peak_bytes)
+
+    @contextmanager
+    def batch(self, size):
+        """
+        Records the stage totals of the enclosed block as one batch of size answers.
+        """
+        with self._lock:
+            before = {name: (stats["calls"], stats["total_s"]) for name, stats in self.stages.items()}
+        start = time.perf_counter()
+        try:
+            with self.stage("batch"):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stages = {}
+                for name, stats in self.stages.items():
+                    calls, total = before.get(name, (0, 0.0))
+                    if stats["calls"] > calls and name != "batch":
+                        stages[name] = {"calls": stats["calls"] - calls, "total_s": stats["total_s"] - total}
+                self.batches.append({
+                    "answers": size,
+                    "total_s": elapsed,
+                    "answers_per_s": size / elapsed if elapsed > 0 else None,
+                    "stages": stages
+                })
+
+    def summary(self):
+        """
+        Returns the per-stage totals and per-batch breakdowns as a JSON-serializable dict.
+        """
+        with self._lock:
+            stages = {}
+            for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]["total_s"]):
+                stages[name] = dict(stats, mean_s=stats["total_s"] / stats["calls"])
+            return {
+                "track_memory": self.track_memory,
+                "stages": stages,
+                "batches": [dict(batch) for batch in self.batches]
+            }
+
+    def to_json(self, path=None):
+        """
+        Returns the summary as JSON, also writing it to path if given.
+        """
+        data = json.dumps(self.summary(), indent=2)
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(data)
+        return data
+
+    def reset(self):
+        """
+        Drops every recorded stage and batch.
+        """
+        with self._lock:
+            self.stages.clear()
+            self.batches.clear()
+
+def get_profiler():
+    """
+    Returns the shared evaluation profiler when SAS_PROFILE_PATH is set, otherwise None.
+    """
+    if not PROFILE_PATH:
+        return None
+    return get_resource("profiler:evaluation", lambda: StageProfiler(track_memory=PROFILE_MEMORY))
+
+def active_profiler():
+    """
+    Returns the profiler stages are currently recorded into, or None.
+    """
+    return _active
+
+@contextmanager
+def stage(name):
+    """
+    Times the enclosed block as stage name in the active profiler; does nothing when
+    no profiler is active.
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
@@ -0,0 +1,32 @@
+import threading
+
+# Process-wide store of loaded models and API clients
+_resources = {}
+_lock = threading.Lock()
+
+def get_resource(name, loader):
+    """
+    Returns the shared resource registered under name, calling loader() to create it on first use.
+    Every module in the process gets the same instance, so models and clients are loaded once.
+    """
+    resource = _resources.get(name)
+    if resource is None:
+        with _lock:
+            # Another thread may have loaded it while we waited for the lock
+            if name not in _resources:
+                _resources[name] = loader()
+            resource = _resources[name]
+    return resource
+
+def is_loaded(name):
+    """
+    Checks whether a resource has already been loaded in this process.
+    """
+    return name in _resources
+
+def clear_resources():
+    """
+    Drops every loaded resource so the next use reloads it.
+    """
+    with _lock:
+        _resources.clear()
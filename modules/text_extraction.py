@@ -0,0 +1,231 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from modules.feature_cache import DEFAULT_CACHE_DIR, FeatureCache
+from modules.registry import get_resource
+
+# Bump whenever extraction output changes so cached texts are not reused
+EXTRACTION_VERSION = "1"
+
+# In-memory cache size in characters, and whether extracted texts are also kept on disk
+DEFAULT_MEMORY_CHARS = int(os.getenv("SAS_TEXT_CACHE_MEMORY_CHARS", str(64 * 1024 * 1024)))
+DISK_CACHE = os.getenv("SAS_TEXT_CACHE_DISK", "1") != "0"
+
+# Characters of a submission sent to the LLM checks; only this prefix is extracted for them
+PROMPT_CHAR_LIMIT = int(os.getenv("SAS_PROMPT_CHAR_LIMIT", "20000"))
+
+def _limit(pieces, max_chars=None):
+    """
+    Yields pieces of text until max_chars characters were yielded, cutting the last one.
+    """
+    remaining = max_chars
+    for piece in pieces:
+        if remaining is not None:
+            if remaining <= 0:
+                return
+            piece = piece[:remaining]
+            remaining -= len(piece)
+        yield piece
+
+def _pdf_pages(file, page_range=None):
+    """
+    Yields the text of each page of an open PDF, parsing a page only when it is reached.
+    """
+    import PyPDF2
+    reader = PyPDF2.PdfReader(file)
+    start, stop = page_range or (0, None)
+    for number in range(len(reader.pages))[start:stop]:
+        yield (reader.pages[number].extract_text() or "") + "\n"
+
+def iter_pdf_pages(file, page_range=None, max_chars=None):
+    """
+    Lazily yields the text of the pages of a PDF file (path or binary file object), each
+    followed by a line break. Pages after the limits are never parsed, so a bounded prefix
+    of a long document costs only the pages it spans.
+    :param page_range: (start, stop) page numbers, counted from 0 like a slice
+    :param max_chars: Stop once this many characters were yielded (the last page is cut)
+    """
+    if isinstance(file, (str, os.PathLike)):
+        # Keep the file open instead of reading it whole into memory
+        with open(file, "rb") as f:
+            yield from _limit(_pdf_pages(f, page_range), max_chars)
+    else:
+        yield from _limit(_pdf_pages(file, page_range), max_chars)
+
+def extract_text_from_pdf(file, page_range=None, max_chars=None):
+    """
+    Extracts text from a PDF file (path or binary file object) using PyPDF2, one line break after each page.
+    """
+    return "".join(iter_pdf_pages(file, page_range, max_chars))
+
+def extract_text_from_docx(file, max_chars=None):
+    """
+    Extracts text from a Word document (path or binary file object) using python-docx.
+    """
+    import docx
+    doc = docx.Document(file)
+    return "".join(_limit((paragraph.text + "\n" for paragraph in doc.paragraphs), max_chars))
+
+def _parse(file_path, data, max_chars=None):
+    """
+    Parses the bytes of a file based on its extension; anything but PDF and DOCX is read
+    as UTF-8 plain text.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.pdf':
+        return extract_text_from_pdf(io.BytesIO(data), max_chars=max_chars)
+    elif extension == '.docx':
+        return extract_text_from_docx(io.BytesIO(data), max_chars=max_chars)
+    # Same newline handling as reading the file in text mode
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")[:max_chars]
+
+class TextExtractor:
+    """
+    Extracts the text of uploaded files once per file content. Texts are keyed by a hash
+    of the file bytes and type, kept in a bounded in-memory LRU and optionally in an
+    on-disk cache, so repeated runs over the same uploads do no parsing at all.
+    """
+    def __init__(self, disk_cache=None, max_memory_chars=DEFAULT_MEMORY_CHARS):
+        self.disk_cache = disk_cache
+        self.max_memory_chars = max_memory_chars
+        self.parsed = 0
+        self._memory = OrderedDict()
+        self._memory_chars = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(file_path, data, max_chars=None):
+        """
+        Returns the cache key of a file's bytes, parsed as its file type (up to max_chars characters).
+        """
+        digest = hashlib.sha256()
+        extension = os.path.splitext(file_path)[1].lower()
+        limit = "" if max_chars is None else f"/prefix-{max_chars}"
+        digest.update(f"text/{EXTRACTION_VERSION}/{extension}{limit}".encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _remember(self, key, text):
+        """
+        Adds a text to the in-memory LRU, evicting the least recently used texts past the limit.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = text
+            self._memory_chars += len(text)
+            while self._memory_chars > self.max_memory_chars and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_chars -= len(evicted)
+
+    def _recall(self, key):
+        """
+        Returns the in-memory text of key, or None.
+        """
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+            return text
+
+    def extract(self, file_path, max_chars=None):
+        """
+        Returns the text of a file, parsing it only if its content was never seen before.
+        Unreadable files give an empty text (and are not cached).
+        :param max_chars: Only extract this many leading characters, stopping the parse early
+        """
+        return self.extract_many([file_path], max_chars)[file_path]
+
+    def extract_many(self, file_paths, max_chars=None):
+        """
+        Returns a dict of file path to text for every file, looking up the disk cache in one batch.
+        With max_chars, an already extracted full text is cut instead of parsing the prefix.
+        """
+        keys = {}
+        texts = {}
+        for file_path in file_paths:
+            try:
+                with open(file_path, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                print(f"Error reading file {file_path}: {e}")
+                texts[file_path] = ""
+                continue
+            full_key = self.make_key(file_path, data)
+            key = full_key if max_chars is None else self.make_key(file_path, data, max_chars)
+            text = self._recall(full_key)
+            if text is None and key != full_key:
+                text = self._recall(key)
+            if text is not None:
+                texts[file_path] = text[:max_chars]
+            else:
+                keys[file_path] = (full_key, key, data)
+
+        stored = {}
+        if self.disk_cache and keys:
+            stored = self.disk_cache.get_many([key for entry in keys.values() for key in entry[:2]])
+        parsed = {}
+        for file_path, (full_key, key, data) in keys.items():
+            text = stored.get(full_key)
+            if text is not None:
+                self._remember(full_key, text)
+                texts[file_path] = text[:max_chars]
+                continue
+            text = stored.get(key)
+            if text is None:
+                text = parsed.get(key)
+            if text is None:
+                try:
+                    text = _parse(file_path, data, max_chars)
+                except Exception as e:
+                    print(f"Error extracting text from {file_path}: {e}")
+                    texts[file_path] = ""
+                    continue
+                self.parsed += 1
+                parsed[key] = text
+            self._remember(key, text)
+            texts[file_path] = text
+
+        if self.disk_cache and parsed:
+            self.disk_cache.put_many(parsed)
+        return {file_path: texts[file_path] for file_path in file_paths}
+
+    def clear(self):
+        """
+        Empties the in-memory cache (the disk cache is left as is).
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_chars = 0
+
+def _load_text_extractor():
+    """
+    Text extractor backed by the on-disk text cache unless SAS_TEXT_CACHE_DISK=0
+    """
+    disk_cache = FeatureCache(os.path.join(DEFAULT_CACHE_DIR, "texts.sqlite")) if DISK_CACHE else None
+    return TextExtractor(disk_cache)
+
+def get_text_extractor():
+    """
+    Shared text extractor, created on first use
+    """
+    return get_resource("cache:texts", _load_text_extractor)
+
+def extract_text(file_path, max_chars=None):
+    """
+    Extracts text from a file based on its extension, through the shared cache.
+    Supports PDF, DOCX, and plain text files.
+    """
+    return get_text_extractor().extract(file_path, max_chars)
+
+def extract_texts(file_paths, max_chars=None):
+    """
+    Extracts the text of every file through the shared cache.
+    :param max_chars: Only extract this many leading characters of each file
+    :return: Dict of file path to text
+    """
+    return get_text_extractor().extract_many(file_paths, max_chars)
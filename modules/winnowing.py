@@ -0,0 +1,259 @@
+import re
+from collections import defaultdict
+import numpy as np
+
+# Fingerprint settings: hashes of K_GRAM-character substrings, one kept per WINDOW
+# consecutive hashes. Any shared passage of at least WINDOW + K_GRAM - 1 normalized
+# characters is guaranteed to share a fingerprint.
+K_GRAM = 25
+WINDOW = 20
+
+# In cohorts of at least MIN_SHARE_DOCUMENTS, fingerprints found in more than this share of
+# the documents are treated as boilerplate and skipped, which also keeps the join near-linear.
+# Smaller uploads keep them: there a passage in most files is more likely a copying ring.
+# Known boilerplate (the answer key, the question text) is removed explicitly instead.
+MAX_DOCUMENT_SHARE = 0.5
+MIN_SHARE_DOCUMENTS = 20
+
+# Copied passages shorter than this many normalized characters are not reported
+MIN_PASSAGE_CHARS = 50
+
+# Characters dropped by normalization: everything but letters and digits
+NON_ALNUM = re.compile(r"[\W_]")
+
+# Odd multiplier of the polynomial k-gram hash (computed modulo 2^64)
+_HASH_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+def normalize(text):
+    """
+    Lowercases a text and keeps only letters and digits, so spacing, punctuation and
+    case changes do not hide a copy
+    :return: The normalized string and the offset in text of each of its characters
+    """
+    # Blank out everything else without changing the length, then select with NumPy
+    marked = NON_ALNUM.sub("\0", text)
+    offsets = np.flatnonzero(np.frombuffer(marked.encode("utf-32-le"), dtype=np.uint32))
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # Lowercasing changed the length (e.g. dotted capital I): keep those characters as they are
+        lowered = "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+    codes = np.frombuffer(lowered.encode("utf-32-le"), dtype=np.uint32)[offsets]
+    return codes.tobytes().decode("utf-32-le"), offsets.astype(np.int64)
+
+def kgram_hashes(normalized, k=K_GRAM):
+    """
+    Hashes every k-character substring of a normalized string
+    :return: Array of len(normalized) - k + 1 hashes (empty for shorter strings)
+    """
+    count = len(normalized) - k + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint32)
+    
+    # Polynomial hash of every k-gram at once, one vectorized step per k-gram character
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    for j in range(k):
+        hashes = hashes * _HASH_BASE + codes[j:j + count]
+    # The high bits mix every character of the k-gram
+    return (hashes >> np.uint64(32)).astype(np.uint32)
+
+def fingerprints(normalized, k=K_GRAM, window=WINDOW):
+    """
+    Winnows the k-gram hashes of a normalized string: the rightmost minimum hash of
+    every window of consecutive hashes is kept, each position once
+    :return: Arrays of fingerprint hashes and their positions in normalized
+    """
+    hashes = kgram_hashes(normalized, k)
+    count = len(hashes)
+    if not count:
+        return hashes, np.empty(0, dtype=np.int64)
+    if count <= window:
+        positions = np.array([count - 1 - int(np.argmin(hashes[::-1]))])
+    else:
+        windows = np.lib.stride_tricks.sliding_window_view(hashes, window)
+        positions = np.arange(len(windows)) + window - 1 - np.argmin(windows[:, ::-1], axis=1)
+        positions = np.unique(positions)
+    return hashes[positions], positions
+
+class FingerprintIndex:
+    """
+    MOSS-style winnowing index over a set of documents. Copied passages are found by
+    joining the documents on shared fingerprints, so the cost grows with the number of
+    shared fingerprints rather than with the number of document pairs.
+    """
+    def __init__(self, k=K_GRAM, window=WINDOW, max_document_share=MAX_DOCUMENT_SHARE,
+                 min_share_documents=MIN_SHARE_DOCUMENTS):
+        self.k = k
+        self.window = window
+        self.max_document_share = max_document_share
+        self.min_share_documents = min_share_documents
+        self.boilerplate = set()
+        self.names = []
+        self.texts = []
+        self.normalized = []
+        self.offsets = []
+        self.lengths = []
+        self.postings = defaultdict(list)
+
+    def add(self, name, text):
+        """
+        Fingerprints a document and adds it to the index.
+        """
+        normalized, offsets = normalize(text)
+        hashes, positions = fingerprints(normalized, self.k, self.window)
+        # As in MOSS, a fingerprint repeated within a document (a page header, a pasted
+        # sentence) is indexed once at its first position, so repetition cannot make the join quadratic
+        hashes, first = np.unique(hashes, return_index=True)
+        positions = positions[first]
+        document = len(self.names)
+        self.names.append(name)
+        self.texts.append(text)
+        self.normalized.append(normalized)
+        self.offsets.append(offsets)
+        self.lengths.append(len(normalized))
+        for fingerprint, position in zip(hashes.tolist(), positions.tolist()):
+            self.postings[fingerprint].append((document, position))
+
+    def add_boilerplate(self, text):
+        """
+        Marks every k-gram of a text (e.g. the answer key or question sheet) as boilerplate,
+        so passages the documents share only through it are not reported.
+        """
+        normalized, _ = normalize(text)
+        self.boilerplate.update(kgram_hashes(normalized, self.k).tolist())
+
+    def _shared(self):
+        """
+        Joins the documents on their fingerprints.
+        :return: Dict of (document, other document) to a list of (position, other position)
+        """
+        if len(self.names) >= self.min_share_documents:
+            max_documents = max(2, int(len(self.names) * self.max_document_share))
+        else:
+            max_documents = len(self.names)
+        shared = defaultdict(list)
+        for fingerprint, postings in self.postings.items():
+            # Each document posts a fingerprint at most once, in the order they were added
+            if len(postings) < 2 or len(postings) > max_documents or fingerprint in self.boilerplate:
+                continue
+            for i, (document1, position1) in enumerate(postings):
+                for document2, position2 in postings[i + 1:]:
+                    shared[(document1, document2)].append((position1, position2))
+        return shared
+
+    def _passages(self, matches, normalized1, normalized2):
+        """
+        Merges matching fingerprint positions into passages that advance together in
+        both documents, then extends each passage over the identical characters around it
+        (winnowing only samples fingerprints, so a passage can start up to a window earlier).
+        :return: List of [start1, end1, start2, end2] in normalized positions
+        """
+        passages = []
+        for position1, position2 in sorted(matches):
+            end1, end2 = position1 + self.k, position2 + self.k
+            for passage in reversed(passages[-4:]):
+                # Consecutive fingerprints of one copied passage are at most a window apart
+                if position1 - passage[1] <= self.window and 0 <= position2 - passage[2] \
+                        and position2 - passage[3] <= self.window:
+                    passage[1] = max(passage[1], end1)
+                    passage[3] = max(passage[3], end2)
+                    break
+            else:
+                passages.append([position1, end1, position2, end2])
+        
+        for passage in passages:
+            while passage[0] > 0 and passage[2] > 0 and normalized1[passage[0] - 1] == normalized2[passage[2] - 1]:
+                passage[0] -= 1
+                passage[2] -= 1
+            while passage[1] < len(normalized1) and passage[3] < len(normalized2) \
+                    and normalized1[passage[1]] == normalized2[passage[3]]:
+                passage[1] += 1
+                passage[3] += 1
+        return passages
+
+    def _repeat_of(self, copied, start1, end1, reported):
+        """
+        Returns the already reported text that the passage at [start1, end1) of the first
+        document repeats, or None. A repeat is the same text up to a few characters around
+        it (fewer than a k-gram) that happen to agree as well, or another alignment of
+        text already reported, e.g. a block of repeated sentences matched one sentence apart.
+        """
+        if copied in reported:
+            return copied
+        for text, passage in reported.items():
+            start, end = passage["normalized_span"]
+            if start <= start1 and end1 <= end:
+                return text
+            if abs(len(text) - len(copied)) < self.k and (text in copied or copied in text):
+                return text
+        return None
+
+    def matches(self, min_chars=MIN_PASSAGE_CHARS):
+        """
+        Finds the passages every pair of documents shares.
+        :return: Dict of (name1, name2) to a dict with "similarity" (the share of the
+            shorter document covered by copied passages) and "passages", each holding the
+            character spans in both original texts, the copied text of the first and the
+            number of repeats of that text merged into it ("occurrences"; the first is kept)
+        """
+        results = {}
+        for (document1, document2), matches in self._shared().items():
+            passages = self._passages(matches, self.normalized[document1], self.normalized[document2])
+            passages = [passage for passage in passages if passage[1] - passage[0] >= min_chars]
+            if not passages:
+                continue
+
+            offsets1, offsets2 = self.offsets[document1], self.offsets[document2]
+            normalized1 = self.normalized[document1]
+            reported = {}
+            for start1, end1, start2, end2 in sorted(passages):
+                # Repeated text gives one passage per repetition; report it once
+                copied = normalized1[start1:end1]
+                repeated = self._repeat_of(copied, start1, end1, reported)
+                if repeated is not None:
+                    reported[repeated]["occurrences"] += 1
+                    continue
+                span1 = (int(offsets1[start1]), int(offsets1[end1 - 1]) + 1)
+                span2 = (int(offsets2[start2]), int(offsets2[end2 - 1]) + 1)
+                reported[copied] = {
+                    "spans": (span1, span2),
+                    "text": self.texts[document1][span1[0]:span1[1]],
+                    "occurrences": 1,
+                    "normalized_span": (start1, end1)
+                }
+            for passage in reported.values():
+                del passage["normalized_span"]
+
+            covered = _covered(passages, 0, 1)
+            shorter = min(self.lengths[document1], self.lengths[document2])
+            results[(self.names[document1], self.names[document2])] = {
+                "similarity": min(1.0, covered / shorter) if shorter else 0.0,
+                "passages": list(reported.values())
+            }
+        return results
+
+def _covered(passages, start, end):
+    """
+    Number of positions covered by the union of the [start, end) intervals of passages.
+    """
+    covered = 0
+    last = -1
+    for passage in sorted(passages, key=lambda passage: passage[start]):
+        low, high = max(passage[start], last), passage[end]
+        if high > low:
+            covered += high - low
+            last = high
+    return covered
+
+def find_copied_passages(texts, min_chars=MIN_PASSAGE_CHARS, k=K_GRAM, window=WINDOW, boilerplate=()):
+    """
+    Finds the passages shared by a dict of document name to text.
+    :param boilerplate: Texts every document may quote, e.g. the answer key
+    :return: Result of FingerprintIndex.matches
+    """
+    index = FingerprintIndex(k, window)
+    for text in boilerplate:
+        index.add_boilerplate(text)
+    for name, text in texts.items():
+        index.add(name, text)
+    return index.matches(min_chars)
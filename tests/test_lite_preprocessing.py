@@ -0,0 +1,55 @@
+import glob
+import os
+import random
+import pytest
+from modules import registry
+from modules.ans_eval import _clean_text, _lite_sentences, _preprocessed_sentences, get_nlp
+from modules.text_extraction import extract_text_from_docx
+
+SAMPLE_ANSWERS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "test_files", "*", "*.docx")))
+
+@pytest.fixture
+def nlp():
+    registry.clear_resources()
+    try:
+        import en_core_web_sm  # noqa: F401
+    except ImportError:
+        # The blank English pipeline has the model's tokenizer and stop words
+        import spacy
+        blank = spacy.blank("en")
+        blank.add_pipe("sentencizer")
+        registry.get_resource("spacy:en_core_web_sm", lambda: blank)
+    yield get_nlp()
+    registry.clear_resources()
+
+def _processed(nlp, text):
+    cleaned = _clean_text(text)
+    return ' '.join(_lite_sentences(cleaned)), ' '.join(_preprocessed_sentences(cleaned, nlp(cleaned)))
+
+def _random_text(rng, special_cases):
+    pieces = []
+    for _ in range(rng.randint(1, 60)):
+        kind = rng.random()
+        if kind < 0.35:
+            pieces.append(rng.choice(special_cases))
+        elif kind < 0.6:
+            pieces.append(rng.choice(["plant", "Energy", "the", "not", "cell's", "no", "a", "x", "O2", "3.5"]))
+        elif kind < 0.8:
+            pieces.append(rng.choice([".", ",", "!", "?", ";", ":", "-", "--", "...", "(", ")", "'", '"', "*", "1. "]))
+        else:
+            pieces.append(rng.choice([" ", "  ", "\n", "\n\n", " \n ", "\t", "   "]))
+        pieces.append(rng.choice(["", " ", " ", " ", "  ", "\n"]))
+    return "".join(pieces)
+
+@pytest.mark.parametrize("path", SAMPLE_ANSWERS)
+def test_lite_matches_spacy_on_sample_answers(nlp, path):
+    lite, parsed = _processed(nlp, extract_text_from_docx(path))
+    assert lite == parsed
+
+def test_lite_matches_spacy_on_tokenizer_special_cases(nlp):
+    rng = random.Random(0)
+    special_cases = sorted(nlp.tokenizer.rules)
+    for _ in range(300):
+        text = _random_text(rng, special_cases)
+        lite, parsed = _processed(nlp, text)
+        assert lite == parsed, text
@@ -0,0 +1,58 @@
+import random
+import pytest
+from modules.minhash_index import MinHashIndex
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+def _essay(seed, count=400):
+    words = random.Random(seed)
+    return " ".join(words.choice(WORDS) for _ in range(count))
+
+def _shingles(text, size=3):
+    words = text.split()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+@pytest.fixture
+def index(tmp_path):
+    index = MinHashIndex(str(tmp_path / "submissions.sqlite"))
+    yield index
+    index.close()
+
+def test_exact_copy_with_the_same_file_name_is_reported(index):
+    essay = _essay(1)
+    index.add("essay.pdf", essay, batch="2025")
+    matches = index.query(essay, batch="2026")
+    assert [(match["name"], match["batch"], match["similarity"]) for match in matches] == [("essay.pdf", "2025", 1.0)]
+
+def test_the_same_batch_is_not_matched_with_itself(index):
+    essay = _essay(2)
+    index.add_many({"a.pdf": essay, "b.pdf": _essay(3)}, batch="2026")
+    assert index.query(essay, batch="2026") == []
+    assert len(index.query(essay, batch="2027")) == 1
+
+def test_own_earlier_submissions_are_skipped_by_identity(index):
+    essay = _essay(4)
+    index.add("student-17", essay, batch="draft")
+    assert index.query(essay, batch="final", name="student-17") == []
+    assert len(index.query(essay, batch="final", name="student-18")) == 1
+
+def test_estimate_follows_the_jaccard_similarity(index):
+    essay = _essay(5).split()
+    edited = list(essay)
+    for i in range(0, len(edited), 12):
+        edited[i] = "changed"
+    original, copy = " ".join(essay), " ".join(edited)
+    index.add("original", original, batch="2025")
+    truth = len(_shingles(original) & _shingles(copy)) / len(_shingles(original) | _shingles(copy))
+    matches = index.query(copy, threshold=0.0, batch="2026")
+    assert matches and matches[0]["similarity"] == pytest.approx(truth, abs=0.12)
+
+def test_unrelated_texts_are_not_candidates(index):
+    index.add_many({f"{i}.txt": _essay(100 + i) for i in range(20)}, batch="2025")
+    assert index.query(_essay(999), batch="2026") == []
+
+def test_settings_mismatch_is_rejected(tmp_path):
+    path = str(tmp_path / "submissions.sqlite")
+    MinHashIndex(path).close()
+    with pytest.raises(ValueError):
+        MinHashIndex(path, num_perm=64, bands=16)
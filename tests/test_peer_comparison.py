@@ -0,0 +1,79 @@
+import random
+import numpy as np
+import pytest
+from modules.peer_comparison import PeerSimilarities, compare_files
+
+pytest.importorskip("sklearn")
+
+VOCABULARY = [f"term{i}" for i in range(200)]
+
+def _texts(seed, documents=70):
+    rng = random.Random(seed)
+    return {f"doc{i}.txt": " ".join(rng.choice(VOCABULARY[:rng.randint(20, 200)]) for _ in range(rng.randint(5, 80)))
+            for i in range(documents)}
+
+def _dense(paths, texts):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    return cosine_similarity(TfidfVectorizer(stop_words="english").fit_transform([texts[path] for path in paths]))
+
+def _kept(result, paths):
+    index = {path: i for i, path in enumerate(paths)}
+    return {(index[file1], index[file2]): score for (file1, file2), score in result.items()}
+
+def test_default_result_is_the_dense_matrix():
+    texts = _texts(0, 12)
+    paths = list(texts)
+    dense = _dense(paths, texts)
+    result = compare_files(paths, texts=texts)
+    assert isinstance(result, dict)
+    assert result == {(paths[i], paths[j]): dense[i][j] for i in range(len(paths)) for j in range(i + 1, len(paths))}
+
+@pytest.mark.parametrize("block_size", [7, 256])
+def test_top_k_keeps_every_rows_closest_peers(block_size):
+    texts = _texts(1)
+    paths = list(texts)
+    dense = _dense(paths, texts)
+    np.fill_diagonal(dense, -np.inf)
+    top_k = 3
+    result = compare_files(paths, top_k=top_k, texts=texts, block_size=block_size)
+    assert isinstance(result, PeerSimilarities)
+    kept = _kept(result, paths)
+    kth = -np.sort(-dense, axis=1)[:, top_k - 1]
+
+    for (i, j), score in kept.items():
+        assert i < j and score == pytest.approx(dense[i, j], abs=1e-6)
+        # Each pair is some row's top-k choice
+        assert dense[i, j] >= min(kth[i], kth[j]) - 1e-9
+    for i, path in enumerate(paths):
+        scores = [score for _, score in result.neighbours(path)][:top_k]
+        assert scores == pytest.approx(sorted(dense[i], reverse=True)[:top_k], abs=1e-6)
+
+@pytest.mark.parametrize("block_size", [7, 256])
+def test_threshold_keeps_exactly_the_pairs_above_it(block_size):
+    texts = _texts(2)
+    paths = list(texts)
+    dense = _dense(paths, texts)
+    threshold = float(np.quantile(dense[np.triu_indices(len(paths), 1)], 0.9))
+    kept = _kept(compare_files(paths, threshold=threshold, texts=texts, block_size=block_size), paths)
+
+    pairs = [(i, j) for i in range(len(paths)) for j in range(i + 1, len(paths))]
+    assert {pair for pair in pairs if dense[pair] >= threshold + 1e-9} <= set(kept)
+    assert set(kept) <= {pair for pair in pairs if dense[pair] >= threshold - 1e-9}
+    assert all(score == pytest.approx(dense[pair], abs=1e-6) for pair, score in kept.items())
+
+def test_top_k_and_threshold_combine():
+    texts = _texts(3)
+    paths = list(texts)
+    both = _kept(compare_files(paths, top_k=2, threshold=0.3, texts=texts, block_size=16), paths)
+    top_k = _kept(compare_files(paths, top_k=2, texts=texts, block_size=16), paths)
+    assert set(both) == {pair for pair, score in top_k.items() if score >= 0.3}
+
+def test_items_are_sorted_and_to_sparse_is_symmetric():
+    texts = _texts(4, 30)
+    paths = list(texts)
+    result = compare_files(paths, top_k=4, texts=texts)
+    scores = [score for _, score in result.items()]
+    assert scores == sorted(scores, reverse=True) and len(scores) == len(result)
+    matrix = result.to_sparse()
+    assert (matrix != matrix.T).nnz == 0 and matrix.nnz == 2 * len(result)
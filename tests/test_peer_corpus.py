@@ -0,0 +1,135 @@
+import random
+import numpy as np
+import pytest
+from modules.peer_corpus import MAX_REMOVED_SHARE, PeerCorpus
+
+pytest.importorskip("sklearn")
+
+VOCABULARY = [f"term{i}" for i in range(300)]
+
+def _text(rng, words=60):
+    return " ".join(rng.choice(VOCABULARY[:rng.randint(40, 300)]) for _ in range(words))
+
+def _reference(texts):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    names = sorted(texts)
+    similarities = cosine_similarity(TfidfVectorizer(stop_words="english").fit_transform([texts[name] for name in names]))
+    return {(names[i], names[j]): similarities[i, j] for i in range(len(names)) for j in range(len(names)) if i != j}
+
+def _build(top_k=None, seed=0, documents=40, removals=10):
+    rng = random.Random(seed)
+    corpus, texts = PeerCorpus(top_k=top_k), {}
+    for i in range(documents):
+        name = f"doc{i}"
+        texts[name] = _text(rng)
+        corpus.add(name, texts[name])
+        # Remove or replace earlier documents along the way
+        if i % 4 == 3 and removals:
+            removals -= 1
+            victim = rng.choice(sorted(texts))
+            if rng.random() < 0.5:
+                corpus.remove(victim)
+                del texts[victim]
+            else:
+                texts[victim] = _text(rng)
+                corpus.add(victim, texts[victim])
+    return corpus, texts
+
+def test_rows_match_a_full_tfidf_refit():
+    corpus, texts = _build()
+    reference = _reference(texts)
+    # Scoring the last document's row only uses the incrementally kept norm sums
+    for name in texts:
+        row = corpus._row(corpus._index[name])
+        for other, score in row.items():
+            assert score == pytest.approx(reference[(name, corpus.names[other])], abs=1e-12)
+
+def test_rescored_pairs_match_a_full_tfidf_refit():
+    corpus, texts = _build()
+    corpus.rescore()
+    reference = _reference(texts)
+    pairs = corpus.similarities()
+    assert {frozenset(pair) for pair in pairs} == {frozenset(pair) for pair in reference if reference[pair] > 0}
+    for pair, score in pairs.items():
+        assert score == pytest.approx(reference[pair], abs=1e-12)
+
+def test_top_k_neighbours_after_rescore():
+    corpus, texts = _build(top_k=3, seed=1)
+    corpus.rescore()
+    reference = _reference(texts)
+    for name in texts:
+        kept = {corpus.names[other] for other in corpus.neighbours[corpus._index[name]]}
+        best = sorted((score for (first, _), score in reference.items() if first == name), reverse=True)[:3]
+        assert sorted((reference[(name, other)] for other in kept), reverse=True) == pytest.approx(best, abs=1e-12)
+
+def test_removing_a_document_listed_one_sidedly():
+    corpus = PeerCorpus(top_k=1)
+    corpus.add("D", "apple banana cherry date elder fig grape")
+    corpus.add("E", "apple banana cherry date elder fig grape kiwi")
+    corpus.add("X", "apple banana cherry lemon mango")
+    # X lists D, but D lists E
+    assert set(corpus.similarities()) == {("D", "E"), ("D", "X")}
+    corpus.remove("D")
+    assert set(corpus.similarities()) == {("E", "X")}
+
+def test_no_removed_document_is_left_in_neighbour_lists():
+    corpus, texts = _build(top_k=2, seed=2, documents=60, removals=20)
+    active = {corpus._index[name] for name in texts}
+    for document, neighbours in enumerate(corpus.neighbours):
+        assert set(neighbours) <= active
+        for other in neighbours:
+            assert document in corpus.listed_by[other]
+
+def test_add_files_skips_unchanged_files(tmp_path):
+    paths = []
+    for i, text in enumerate(["alpha beta gamma", "beta gamma delta", "gamma delta epsilon"]):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(text)
+        paths.append(str(path))
+    extracted = []
+    def extract_text(path):
+        extracted.append(path)
+        with open(path) as f:
+            return f.read()
+
+    corpus = PeerCorpus()
+    assert corpus.add_files(paths, extract_text) == paths
+    assert corpus.add_files(paths, extract_text) == []
+    (tmp_path / "1.txt").write_text("beta gamma zeta")
+    assert corpus.add_files(paths[:2], extract_text) == [paths[1]]
+    assert extracted == paths + [paths[1]]
+    assert len(corpus) == 2 and paths[2] not in corpus
+
+def test_save_and_load(tmp_path):
+    corpus, texts = _build(top_k=2, seed=3)
+    path = str(tmp_path / "corpus.pkl")
+    corpus.save(path)
+    loaded = PeerCorpus.load(path, top_k=2)
+    assert loaded.similarities() == corpus.similarities()
+    assert np.array_equal(loaded.sums, corpus.sums)
+    assert len(PeerCorpus.load(path, top_k=None)) == 0
+    assert len(PeerCorpus.load(str(tmp_path / "missing.pkl"))) == 0
+
+def test_removed_slots_are_compacted(tmp_path):
+    rng = random.Random(4)
+    corpus = PeerCorpus(top_k=3)
+    texts = {}
+    # One class after another replaces the corpus, as in the app
+    for cohort in range(6):
+        texts = {f"class{cohort}/{i}": _text(rng) for i in range(15)}
+        for name, text in texts.items():
+            corpus.add(name, text)
+        for name in [name for name in corpus._index if name not in texts]:
+            corpus.remove(name)
+        assert len(corpus.names) - len(corpus) <= MAX_REMOVED_SHARE * len(corpus.names)
+    corpus.save(str(tmp_path / "corpus.pkl"))
+    assert sorted(corpus.names) == sorted(texts) and all(corpus.active) and len(corpus.sums) == len(texts)
+    assert all(corpus.postings[term][0] for term in corpus.postings)
+
+    reference = _reference(texts)
+    for name in texts:
+        for other, score in corpus._row(corpus._index[name]).items():
+            assert score == pytest.approx(reference[(name, corpus.names[other])], abs=1e-12)
+    for document, neighbours in enumerate(corpus.neighbours):
+        assert all(document in corpus.listed_by[other] for other in neighbours)
@@ -0,0 +1,71 @@
+import random
+from difflib import SequenceMatcher
+from modules.ans_eval import INDEXED_MATCH_MIN_PAIRS, SubsequenceIndex, _similar_pairs
+
+WORDS = ("energy light plant cell water oxygen glucose chlorophyll leaf the of and in is "
+         "converts stored releases absorbs carbon dioxide sugar process reaction").split()
+
+def _sentences(rng, count):
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12))) for _ in range(count)]
+
+def _edited(rng, sentence):
+    words = sentence.split()
+    for _ in range(rng.randint(0, 3)):
+        position = rng.randrange(len(words) + 1)
+        if rng.random() < 0.5 and position < len(words):
+            del words[position]
+        else:
+            words.insert(position, rng.choice(WORDS))
+    return " ".join(words)
+
+def _scrambled(rng, count):
+    # Short strings where scattered single characters make up most of a match
+    return ["".join(rng.choice("abcdefghijklmnop ") for _ in range(rng.randint(3, 15))) for _ in range(count)]
+
+def _brute_force(strings1, strings2, threshold, first_only=False):
+    pairs = []
+    for i, string1 in enumerate(strings1):
+        for string2 in strings2:
+            ratio = SequenceMatcher(None, string1, string2).ratio()
+            if ratio > threshold:
+                pairs.append((i, ratio))
+                if first_only:
+                    break
+    return pairs
+
+def _lcs_length(a, b):
+    row = [0] * (len(b) + 1)
+    for char in a:
+        previous = 0
+        for j, other in enumerate(b):
+            previous, row[j + 1] = row[j + 1], previous + 1 if char == other else max(row[j + 1], row[j])
+    return row[-1]
+
+def test_lcs_lengths_match_dynamic_programming():
+    rng = random.Random(0)
+    strings = _scrambled(rng, 40) + ["", "a", "aaaa"]
+    index = SubsequenceIndex(strings)
+    for query in _scrambled(rng, 20) + ["", "aa"]:
+        assert index.lcs_lengths(query).tolist() == [_lcs_length(query, string) for string in strings]
+
+def test_indexed_sentence_matches_equal_brute_force():
+    for seed in range(5):
+        rng = random.Random(seed)
+        strings2 = _sentences(rng, 80)
+        strings1 = [_edited(rng, rng.choice(strings2)) for _ in range(40)] + _sentences(rng, 40)
+        assert len(strings1) * len(strings2) > INDEXED_MATCH_MIN_PAIRS
+        assert list(_similar_pairs(strings1, strings2, 0.6)) == _brute_force(strings1, strings2, 0.6)
+
+def test_indexed_phrase_matches_equal_brute_force():
+    for seed in range(5):
+        rng = random.Random(seed)
+        strings1, strings2 = _scrambled(rng, 60) + _sentences(rng, 20), _scrambled(rng, 60) + _sentences(rng, 20)
+        assert len(strings1) * len(strings2) > INDEXED_MATCH_MIN_PAIRS
+        for threshold in (0.6, 0.8):
+            assert (list(_similar_pairs(strings1, strings2, threshold, first_only=True))
+                    == _brute_force(strings1, strings2, threshold, first_only=True))
+
+def test_empty_strings_match_like_sequence_matcher():
+    strings2 = [""] + ["x" * 3] * 60
+    strings1 = ["", "xxx"] * 30
+    assert list(_similar_pairs(strings1, strings2, 0.8)) == _brute_force(strings1, strings2, 0.8)
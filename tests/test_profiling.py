@@ -0,0 +1,37 @@
+import tracemalloc
+from modules.profiling import StageProfiler, active_profiler, stage
+
+def test_reentering_keeps_tracing_for_the_outer_block():
+    profiler = StageProfiler(track_memory=True)
+    with profiler:
+        with profiler, profiler.batch(1):
+            with stage("inner"):
+                data = [0] * 10000
+        assert tracemalloc.is_tracing()
+        with stage("outer"):
+            data = [0] * 10000
+    del data
+    assert not tracemalloc.is_tracing()
+    stages = profiler.summary()["stages"]
+    assert stages["inner"]["peak_bytes"] > 0
+    assert stages["outer"]["peak_bytes"] > 0
+
+def test_nested_exits_restore_the_previously_active_profiler():
+    outer, inner = StageProfiler(), StageProfiler()
+    with outer:
+        with inner:
+            with inner:
+                assert active_profiler() is inner
+            assert active_profiler() is inner
+        assert active_profiler() is outer
+    assert active_profiler() is None
+
+def test_stages_record_calls_into_the_active_profiler():
+    profiler = StageProfiler()
+    with profiler:
+        for _ in range(3):
+            with stage("sequence"):
+                pass
+    with stage("sequence"):
+        pass
+    assert profiler.summary()["stages"]["sequence"]["calls"] == 3
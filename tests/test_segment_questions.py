@@ -0,0 +1,34 @@
+from modules.ans_eval import segment_questions
+
+def test_consecutive_questions():
+    assert segment_questions("1. First answer\n2. Second answer\n3) Third answer") == {
+        "1": "First answer", "2": "Second answer", "3": "Third answer"
+    }
+
+def test_skipped_question_does_not_swallow_the_rest():
+    assert segment_questions("1. X is first.\n3. Z is the last thing.") == {
+        "1": "X is first.", "3": "Z is the last thing."
+    }
+
+def test_list_inside_the_key_is_not_taken_for_questions():
+    key = "1. Name the layers.\n1. Physical\n2. Data link\n3. Network\n2. Explain TCP.\n3. What is UDP?"
+    assert segment_questions(key) == {
+        "1": "Name the layers.\n1. Physical\n2. Data link\n3. Network",
+        "2": "Explain TCP.",
+        "3": "What is UDP?"
+    }
+
+def test_list_ending_just_before_the_next_question():
+    script = "1. a\n2. b\n1. x\n2. y\n3. c\n4. d"
+    assert segment_questions(script) == {"1": "a", "2": "b\n1. x\n2. y", "3": "c", "4": "d"}
+
+def test_student_script_is_split_on_the_key_numbers():
+    key_segments = segment_questions("1. Define osmosis.\n2. Define diffusion.\n3. Compare them.")
+    script = "Q1. Water moves across a membrane.\n3. Osmosis needs a membrane.\n7. Not a question"
+    assert segment_questions(script, numbers=key_segments) == {
+        "1": "Water moves across a membrane.",
+        "3": "Osmosis needs a membrane.\n7. Not a question"
+    }
+
+def test_unnumbered_text():
+    assert segment_questions("Just one paragraph of answer.") == {}
@@ -0,0 +1,85 @@
+import glob
+import os
+import random
+import re
+from difflib import SequenceMatcher
+from statistics import mean
+import pytest
+from modules.ans_eval import SEQUENCE_CHAR_LIMIT, _sequence_cuts, sequence_similarity
+from modules.text_extraction import extract_text_from_docx
+
+SAMPLE_ANSWERS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "test_files", "*", "*.docx")))
+WORDS = re.findall(r"[a-z]+", " ".join(extract_text_from_docx(path) for path in SAMPLE_ANSWERS).lower())
+
+def _text(chars, rng):
+    words = []
+    while sum(len(word) + 1 for word in words) <= chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:chars].strip()
+
+def _edit(text, rate, rng):
+    words = []
+    for word in text.split():
+        roll = rng.random()
+        if roll < rate / 3:
+            continue  # Deleted
+        if roll < 2 * rate / 3:
+            words.append(rng.choice(WORDS))  # Replaced
+        elif roll < rate:
+            words.extend([word, rng.choice(WORDS)])  # Followed by an insertion
+        else:
+            words.append(word)
+    return " ".join(words)
+
+def _exact(text1, text2):
+    return SequenceMatcher(None, text1, text2).ratio()
+
+def test_identical_and_disjoint_texts():
+    assert sequence_similarity("same words here", "same words here") == 1.0
+    assert sequence_similarity("abc " * 2000, "xyz " * 2000) == 0.0
+
+@pytest.mark.parametrize("folder", sorted({os.path.dirname(path) for path in SAMPLE_ANSWERS}))
+def test_answers_up_to_the_limit_keep_the_character_ratio(folder):
+    key = extract_text_from_docx(os.path.join(folder, "ak.docx")).lower()
+    for path in sorted(glob.glob(os.path.join(folder, "sa*.docx"))):
+        answer = extract_text_from_docx(path).lower()
+        assert len(answer) <= SEQUENCE_CHAR_LIMIT
+        assert sequence_similarity(answer, key) == _exact(answer, key)
+
+@pytest.mark.parametrize("rate", [0.05, 0.2, 0.5])
+def test_no_jump_past_the_limit(rate):
+    rng = random.Random(int(rate * 100))
+    below, above, exact_above = [], [], []
+    for _ in range(30):
+        for chars, scores in ((SEQUENCE_CHAR_LIMIT - 300, below), (SEQUENCE_CHAR_LIMIT + 300, above)):
+            text = _text(chars, rng)
+            edited = _edit(text, rate, rng)
+            scores.append(sequence_similarity(text, edited))
+            if scores is above:
+                exact_above.append(_exact(text, edited))
+    # Segments are scored like texts at the limit, on the character ratio's scale
+    assert mean(above) == pytest.approx(mean(below), abs=0.08)
+    assert mean(above) == pytest.approx(mean(exact_above), abs=0.08)
+
+def test_cuts_are_aligned_and_bounded():
+    rng = random.Random(1)
+    text1 = _text(6 * SEQUENCE_CHAR_LIMIT, rng)
+    text2 = _edit(text1, 0.1, rng)
+    cuts = _sequence_cuts(text1, text2, SEQUENCE_CHAR_LIMIT)
+    assert cuts[0] == (0, 0) and cuts[-1] == (len(text1), len(text2))
+    for (start1, start2), (end1, end2) in zip(cuts, cuts[1:]):
+        assert start1 < end1 and start2 < end2
+        assert max(end1 - start1, end2 - start2) <= 1.5 * SEQUENCE_CHAR_LIMIT
+    # Cuts fall on shared words, so each segment pair covers the same passage
+    for start1, start2 in cuts[1:-1]:
+        assert text1[start1:].split()[:3] == text2[start2:].split()[:3]
+
+def test_resynchronizes_after_a_long_insertion():
+    rng = random.Random(2)
+    text1 = _text(4 * SEQUENCE_CHAR_LIMIT, rng)
+    text2 = _edit(text1, 0.05, rng)
+    middle = text2.index(" ", len(text2) // 2)
+    inserted = text2[:middle] + " " + _text(2 * SEQUENCE_CHAR_LIMIT, rng) + text2[middle:]
+    # The copied text scores as before; only the inserted characters are unmatched
+    expected = sequence_similarity(text1, text2) * (len(text1) + len(text2)) / (len(text1) + len(inserted))
+    assert sequence_similarity(text1, inserted) == pytest.approx(expected, abs=0.05)
@@ -0,0 +1,60 @@
+import random
+import numpy as np
+from modules import ans_eval
+from modules.ans_eval import (COMPONENTS, SIMILARITY_STAGES, AnalyzedText, calculate_similarity, combine_similarity,
+                              rescore_components, similarity_category)
+
+# Points around the boost, penalty and cap thresholds as well as uniform ones
+EDGES = (0.0, 0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 1.0)
+
+def _component(rng):
+    return rng.choice(EDGES) + rng.uniform(-0.01, 0.01) if rng.random() < 0.5 else rng.random()
+
+def _components(rng):
+    return {name: min(1.0, max(0.0, _component(rng))) for name in COMPONENTS}
+
+def _analyzed(text):
+    return AnalyzedText(text, text, [], [], [], [], [], {}, np.zeros(1), 0.0, len(text.split()), text, [])
+
+def test_missing_components_at_zero_and_one_bound_every_completion():
+    rng = random.Random(0)
+    for _ in range(2000):
+        components = _components(rng)
+        for done in range(1, len(SIMILARITY_STAGES)):
+            known = {name for stage in SIMILARITY_STAGES[:done] for name in stage}
+            low = combine_similarity({name: components[name] if name in known else 0.0 for name in COMPONENTS})
+            high = combine_similarity({name: components[name] if name in known else 1.0 for name in COMPONENTS})
+            assert low <= combine_similarity(components) <= high
+            if similarity_category(low) == similarity_category(high):
+                assert similarity_category(combine_similarity(components)) == similarity_category(low)
+
+def test_rescore_components_matches_combine_similarity():
+    rng = random.Random(1)
+    rows = [_components(rng) for _ in range(500)]
+    matrix = np.array([[row[name] for name in COMPONENTS] for row in rows])
+    assert rescore_components(matrix).tolist() == [combine_similarity(row) for row in rows]
+
+def test_early_exit_keeps_the_category_of_the_full_computation(monkeypatch):
+    rng = random.Random(2)
+    student, key = _analyzed("light energy stored in glucose"), _analyzed("glucose stores light energy")
+    skipped = 0
+    for _ in range(300):
+        components = _components(rng)
+        calls = []
+        monkeypatch.setattr(ans_eval, "detect_key_phrase_matches",
+                            lambda *args: calls.append("phrase") or components["phrase"])
+        monkeypatch.setattr(ans_eval, "sequence_similarity",
+                            lambda *args: calls.append("sequence") or components["sequence"])
+        first = {name: components[name] for name in SIMILARITY_STAGES[0]}
+
+        full = calculate_similarity(student, key, first, strict=True)
+        assert full == combine_similarity(components)
+        calls.clear()
+        trace = {}
+        fast = calculate_similarity(student, key, first, strict=False, trace=trace)
+        low, high = trace["score_bounds"]
+        assert low <= full <= high and fast == (low + high) / 2
+        assert similarity_category(fast) == similarity_category(full)
+        assert calls == [name for name in trace["stages"] if name not in first]
+        skipped += len(trace["stages"]) < len(COMPONENTS)
+    assert skipped
@@ -0,0 +1,45 @@
+import random
+import pytest
+from modules.minhash_index import MinHashIndex
+from modules.peer_comparison import compare_with_history, upload_batch
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+def _essay(seed, count=300):
+    words = random.Random(seed)
+    return " ".join(words.choice(WORDS) for _ in range(count))
+
+@pytest.fixture
+def index(tmp_path):
+    index = MinHashIndex(str(tmp_path / "submissions.sqlite"))
+    yield index
+    index.close()
+
+def _check(index, texts, batch=None):
+    files = list(texts)
+    return compare_with_history(files, index=index, batch=batch, texts=texts)
+
+def test_rerunning_an_upload_set_does_not_match_it_with_itself(index):
+    texts = {f"{i}.txt": _essay(i) for i in range(4)}
+    assert all(matches == [] for matches in _check(index, texts).values())
+    # A new session checks the same files again, then with a late file added
+    assert all(matches == [] for matches in _check(index, texts).values())
+    texts["late.txt"] = _essay(10)
+    assert all(matches == [] for matches in _check(index, texts).values())
+    assert len(index) == 5
+
+def test_a_new_class_copying_an_earlier_one_is_reported(index):
+    _check(index, {f"{i}.txt": _essay(i) for i in range(4)})
+    # Same file names, and one exact copy of an earlier submission
+    texts = {"0.txt": _essay(0), "1.txt": _essay(21), "2.txt": _essay(22), "3.txt": _essay(23)}
+    result = _check(index, texts)
+    assert [(match["name"], match["similarity"]) for match in result["0.txt"]] == [("0.txt", 1.0)]
+    assert all(result[name] == [] for name in ("1.txt", "2.txt", "3.txt"))
+
+def test_upload_batch_is_stable_and_assignment_labels_win(index):
+    texts = {f"{i}.txt": _essay(30 + i) for i in range(3)}
+    label = upload_batch(texts, index)
+    assert upload_batch(dict(reversed(list(texts.items()))), index) == label
+    _check(index, texts, batch="Biology 101 / Essay 2")
+    assert upload_batch(texts, index) == "Biology 101 / Essay 2"
+    assert all(matches == [] for matches in _check(index, texts, batch="Biology 101 / Essay 2").values())
@@ -0,0 +1,71 @@
+import random
+from modules.winnowing import K_GRAM, WINDOW, FingerprintIndex, find_copied_passages, fingerprints, normalize
+
+def _filler(seed, words=150):
+    rng = random.Random(seed)
+    return " ".join("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9)))
+                    for _ in range(words))
+
+PASSAGE = ("Photosynthesis converts light energy into chemical energy stored in glucose, "
+           "releasing oxygen as a by-product of splitting water molecules.")
+
+def test_normalize_keeps_offsets_into_the_original_text():
+    text = "Hello, World! 42_x"
+    normalized, offsets = normalize(text)
+    assert normalized == "helloworld42x"
+    assert "".join(text[offset] for offset in offsets).lower() == normalized
+
+def test_every_window_keeps_a_fingerprint():
+    normalized, _ = normalize(_filler(1))
+    _, positions = fingerprints(normalized)
+    assert positions[0] < WINDOW and len(normalized) - K_GRAM - positions[-1] < WINDOW
+    assert all(later - earlier <= WINDOW for earlier, later in zip(positions, positions[1:]))
+
+def test_reported_spans_hold_the_copied_passage_in_both_texts():
+    text1 = _filler(2) + " " + PASSAGE + " " + _filler(3)
+    text2 = _filler(4, 40) + "\n" + PASSAGE.upper().replace(" ", "  ") + "\n" + _filler(5)
+    result = find_copied_passages({"a": text1, "b": text2})
+    (span1, span2), = [passage["spans"] for passage in result[("a", "b")]["passages"]]
+    # Spans run from the first to the last copied letter or digit
+    assert text1[span1[0]:span1[1]] == PASSAGE.rstrip(".")
+    assert normalize(text2[span2[0]:span2[1]])[0] == normalize(PASSAGE)[0]
+
+def test_reordered_copying_is_found():
+    other = "A second sentence that was copied as well, word for word, into the other essay."
+    text1 = _filler(6) + " " + PASSAGE + " " + _filler(7) + " " + other
+    text2 = other + " " + _filler(8) + " " + PASSAGE
+    passages = find_copied_passages({"a": text1, "b": text2})[("a", "b")]["passages"]
+    assert sorted(passage["text"] for passage in passages) == sorted([PASSAGE.rstrip("."), other.rstrip(".")])
+
+def test_copying_ring_in_a_small_upload_is_reported():
+    for size in (3, 5):
+        texts = {str(i): _filler(10 + i) + " " + PASSAGE + " " + _filler(20 + i) for i in range(3)}
+        texts.update({str(i): _filler(30 + i) for i in range(3, size)})
+        assert set(find_copied_passages(texts)) == {("0", "1"), ("0", "2"), ("1", "2")}
+
+def test_answer_key_quotes_are_boilerplate():
+    key = "1. " + PASSAGE + " Explain why."
+    texts = {str(i): PASSAGE + " " + _filler(40 + i) for i in range(3)}
+    assert find_copied_passages(texts, boilerplate=[key]) == {}
+    assert len(find_copied_passages(texts)) == 3
+
+def test_passages_in_most_of_a_large_cohort_are_skipped():
+    texts = {str(i): PASSAGE for i in range(30)}
+    for min_share_documents, pairs in ((20, 0), (50, 30 * 29 // 2)):
+        index = FingerprintIndex(min_share_documents=min_share_documents)
+        for name, text in texts.items():
+            index.add(name, text)
+        assert len(index.matches()) == pairs
+
+def test_repeated_text_is_reported_once():
+    # A sentence pasted over and over, and a page header repeated on every page
+    texts = {"a": _filler(50) + " " + PASSAGE * 300, "b": _filler(51) + " " + PASSAGE * 300}
+    (passage,) = find_copied_passages(texts)[("a", "b")]["passages"]
+    assert PASSAGE.rstrip(".") in passage["text"]
+    header = "Department of Biology, Final Examination, answer script continued on the next page. "
+    texts = {str(i): "".join(header + _filler(100 * i + page, 12) for page in range(80)) for i in range(5)}
+    result = find_copied_passages(texts)
+    assert len(result) == 10
+    for match in result.values():
+        (passage,) = match["passages"]
+        assert header.rstrip(". ") in passage["text"] and passage["occurrences"] > 1